@@ -26,6 +26,32 @@
 #   URL_LANG: "en"
 #   URL_POSTCODE: ""
 #   WEB_VER: "APRIL22"
+#   FETCH_WORKERS: 4
+#   FETCH_TIMEOUT: 20
+#   FETCH_DELAY: 0
+#   FETCH_RETRIES: 2
+#   FETCH_BACKOFF: 2
+#   FETCH_STREAM: True
+#   PARSE_PROCESSES: 0
+#   SHARED_CACHE: "/conf/apps/accu_allergies_cache.db"
+#   SHARED_CACHE_TTL: 3600
+#   SHARED_CACHE_SIZE: 50
+#   REFRESH_MIN: 3
+#   REFRESH_MAX: 24
+#   STATS_SENSOR: "sensor.acc_refresh_stats"
+#   PROM_FILE: ""
+#   HISTORY_FILE: "./allergies_history.db"
+#
+# or for more than one location, in place of the URL_ and WEB_VER values
+#
+#   LOCATIONS:
+#     - URL_ID: "21921"
+#       URL_CITY: "canberra"
+#       URL_COUNTRY: "au"
+#       URL_LANG: "en"
+#       WEB_VER: "APRIL22"
+#       PREFIX: "acc_canberra"
+#       NAME: "Canberra"
 #
 # PRE APRIL 2022
 # https://www.accuweather.com/en/au/canberra/21921/allergies-weather/21921
@@ -40,44 +66,40 @@
 
 ############################################################
 
-# import the function libraries for beautiful soup
-from distutils.log import debug
-from bs4 import BeautifulSoup
+# import the function libraries
 import json
 import datetime
 import appdaemon.plugins.hass.hassapi as hass
-import requests
-import shelve
-import urllib.parse
+import time
+import random
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+#getting, keeping and reading the pages is in accu_pipeline.py, next to this file
+from accu_pipeline import Accu_Pipeline, Accu_History
 
-class Get_Accu_Allergies(hass.Hass):
+
+class Get_Accu_Allergies(hass.Hass, Accu_Pipeline):
 
     ACC_FLAG = ""
     DEB_FLAG = ""
-    URL_LANG = ""
-    URL_COUNTRY = ""
-    URL_CITY = ""
-    URL_ID = ""
-    URL_POSTCODE = ""
-    WEB_VER = ""
-
-    payload = {}
-    headers = {
-        'User-Agent': 'Mozilla/5.0'
-    }
-        
-    #"https://www.accuweather.com/URL_LANG/URL_COUNTRY/URL_CITY/URL_POSTCODE/health-activities/URL_ID"
-    #url building
-    url_base = "https://www.accuweather.com"
-    
-    # simple - asthma, arthritis, migraine, sinus
-    
-    url_txt_setsA = [["/asthma-weather/","asthma"], ["/arthritis-weather/","arthritis"], ["/migraine-weather/","migraine"], [ "/sinus-weather/","sinus"], ["/air-quality-index/", "air"]]
-    url_txt_setsB = [["/health-activities/","health"],["/air-quality-index/", "air"]]
-    # extended - cold, flu, ragweed pollen, grass pollen, tree pollen, mold, dust
-    #["/allergies-weather/","allergies"], ["/cold-flu-weather/","coldflu"]
-    url_txt_xtdA = [["/allergies-weather/", "?name=ragweed-pollen" , "ragweed"], ["/allergies-weather/", "?name=grass-pollen" , "grass"], ["/allergies-weather/", "?name=tree-pollen" , "tree"], ["/allergies-weather/", "?name=mold" , "mold"], ["/allergies-weather/", "?name=dust-dander" , "dust"], ["/cold-flu-weather/", "?name=common-cold" , "cold"], ["/cold-flu-weather/", "?name=flu" , "flu"]]
-    url_txt_xtdB = []
+    STATS_SENSOR = "sensor.acc_refresh_stats"
+    PROM_FILE = ""
+    HISTORY_FILE = ""
+    #single background worker, so refreshes never hold up appdaemon callbacks and never overlap
+    worker = None
+    #the timer for the next refresh, and the day the save file was last tidied up
+    refresh_handle = None
+    compacted = None
+    #running totals of the timings and counts since the app started
+    metric_totals = None
+    #the daily values of each index over time
+    history = None
+    #the last state and attributes sent to HA for each sensor, and the ones waiting to be sent this cycle
+    published = None
+    pending_states = None
+    #what the last snapshot written was made for
+    snapshot_saved = None
 
     icon_txt_set = {'Air Quality': 'air-purifier','Dust & Dander': 'weather-dust','Sinus Pressure': 'head-sync','Asthma': 'head-dots-horizontal',
                     'Migraine': 'head-alert','Arthritis': 'bone','Common Cold': 'head-snowflake','Flu': 'head-flash','Indoor Pests': 'bug',
@@ -86,475 +108,406 @@ class Get_Accu_Allergies(hass.Hass):
                     'Golf': 'golf','Biking & Cycling': 'bike','Beach & Pool': 'beach','Stargazing': 'weather-night','Hiking': 'hiking',
                     'Tree Pollen': 'tree'}
 
-    def cleanString(self, s):
-        retstr = ""
-        for chars in s:
-                retstr += self.removeNonAscii(chars)
-        return retstr
-
-    def removeNonAscii(self, s): 
-        return ''.join(i for i in s if ord(i)<126 and ord(i)>31)    
-
     # run to setup the system
     def initialize(self):
         #get the info for the system
-        self.ACC_FILE = self.args["ACC_FILE"]
+        self.read_settings()
         self.ACC_FLAG = self.args["ACC_FLAG"]
         self.DEB_FLAG = self.args["DEB_FLAG"]
-        self.URL_LANG = self.args["URL_LANG"]
-        self.URL_COUNTRY = self.args["URL_COUNTRY"]
-        self.URL_CITY = self.args["URL_CITY"]
-        self.URL_ID = self.args["URL_ID"]
-        
+        #where to show the timings for each refresh, and a file to also write them to for prometheus
         try:
-            self.WEB_VER = self.args["WEB_VER"]
+            self.STATS_SENSOR = self.args["STATS_SENSOR"]
         except:
-            self.WEB_VER = ""
-
-        #see if they have included a postcode value, if not, just use the ID value
+            self.STATS_SENSOR = "sensor.acc_refresh_stats"
         try:
-            self.URL_POSTCODE = self.args["URL_POSTCODE"]
+            self.PROM_FILE = self.args["PROM_FILE"]
         except:
-            self.URL_POSTCODE = self.URL_ID
-        #check that the postcode is blank, and if so set it to the ID value
-        if self.URL_POSTCODE == "":
-            self.URL_POSTCODE = self.URL_ID
-
-        #this supports the two website variations
-        if self.WEB_VER == "APRIL22":
-            self.url_txt_sets = self.url_txt_setsB
-            self.url_txt_xtd = self.url_txt_xtdB
-        else:
-            self.url_txt_sets = self.url_txt_setsA
-            self.url_txt_xtd = self.url_txt_xtdA
+            self.PROM_FILE = ""
+        #where to keep the daily values of each index, set to "" to not keep them
+        try:
+            self.HISTORY_FILE = self.args["HISTORY_FILE"]
+        except:
+            self.HISTORY_FILE = self.ACC_FILE + "_history.db"
+        if self.HISTORY_FILE:
+            self.history = Accu_History(self.HISTORY_FILE)
+
+        #the sensors as last sent to HA, so a restart can send them again without reading any pages
+        self.SNAPSHOT_FILE = self.ACC_FILE + "_sensors.json"
 
-        #create the original sensors
-        self.load_sensors()
+        #create the original sensors, in the background so appdaemon isn't held up
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.run_in_worker(self.start_sensors)
 
         #set the listener for the update flag for getting the data
         self.listen_state(self.get_all_data, self.ACC_FLAG, new="on")
         #set the listener for update flag for updating the sensor from the files
         self.listen_state(self.set_acc_sensors, self.DEB_FLAG, new="on")
+        #HA loses the sensors when it restarts, so send them all again when it comes back
+        self.listen_event(self.ha_restarted, "plugin_started")
 
-        # set to run each morning at 5.07am
-        runtime = datetime.time(5,7,0)
-        self.run_daily(self.daily_load_sensors, runtime)
-        
+        #check for pages that are due, starting at a random time so every install isn't asking at once
+        self.refresh_handle = self.run_in(self.refresh_due, random.randint(60, 600))
 
     #get the information from each of the pages and write them into text files for reuse
     def get_all_data(self, entity, attribute, old, new, kwargs):
         #call the data builder
-        self.get_html_data()
-        #turn off the flag
-        self.turn_off(self.ACC_FLAG)
+        self.run_in_worker(self.get_all_data_run)
+
+    def get_all_data_run(self):
+        try:
+            #load sensors, if the website had anything new, as the scheduled refreshes will see the same pages and leave them
+            if self.get_html_data():
+                self.load_sensors()
+        finally:
+            #turn off the flag
+            self.turn_off(self.ACC_FLAG)
+            self.schedule_refresh()
+
+    #queue some work for the background worker
+    def run_in_worker(self, func, *args):
+        return self.worker.submit(self.run_job, func, *args)
+
+    #run the work, letting the sensor know if it fails
+    def run_job(self, func, *args):
+        self.metrics = {}
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            self.log("refresh failed - " + repr(e), level="WARNING")
+            self.set_refresh_status("failed - " + repr(e))
+        finally:
+            self.publish_metrics(func.__name__, time.perf_counter() - start)
+
+    #show where the time went in the last job on the stats sensor, and in the prometheus file
+    def publish_metrics(self, job, duration):
+        metrics = self.metrics or {}
+        fetch_seconds = metrics.get("fetch_seconds", {})
+        fetch_bytes = metrics.get("fetch_bytes", {})
+        parse_seconds = metrics.get("parse_seconds", {})
+        if self.metric_totals is None:
+            self.metric_totals = {}
+        totals = self.metric_totals
+        totals["jobs"] = totals.get("jobs", 0) + 1
+        totals["requests"] = totals.get("requests", 0) + len(fetch_seconds)
+        totals["bytes"] = totals.get("bytes", 0) + sum(fetch_bytes.values())
+        totals["published"] = totals.get("published", 0) + metrics.get("published", 0)
+        totals["skipped"] = totals.get("skipped", 0) + metrics.get("skipped", 0)
+
+        attributes = {"icon": "mdi:timer-outline", "friendly_name": "ACC Allergy refresh stats", "unit_of_measurement": "s",
+                      "job": job,
+                      "pages_fetched": len(fetch_seconds),
+                      "shared_cache_hits": metrics.get("shared_cache_hits", 0),
+                      "bytes_downloaded": sum(fetch_bytes.values()),
+                      "fetch_seconds": {txt: round(fetch_seconds[txt], 3) for txt in fetch_seconds},
+                      "pages_parsed": len(parse_seconds),
+                      "parse_seconds": {txt: round(parse_seconds[txt], 4) for txt in parse_seconds},
+                      "shelve_seconds": round(metrics.get("shelve_seconds", 0), 4),
+                      "shelve_opens": metrics.get("shelve_opens", 0),
+                      "sensors_published": metrics.get("published", 0),
+                      "sensors_skipped": metrics.get("skipped", 0)}
+        self.set_state(self.STATS_SENSOR, state=round(duration, 3), replace=True, attributes=attributes)
+
+        if self.PROM_FILE:
+            self.write_prom_file(job, duration, metrics)
+
+    #write the measurements in the prometheus text format, for the node exporter textfile collector
+    def write_prom_file(self, job, duration, metrics):
+        lines = []
+        def add(name, kind, help_text, values):
+            lines.append("# HELP accu_allergies_" + name + " " + help_text)
+            lines.append("# TYPE accu_allergies_" + name + " " + kind)
+            for labels, value in values:
+                label_txt = ",".join(key + '="' + str(labels[key]).replace('"', "'") + '"' for key in labels)
+                lines.append("accu_allergies_" + name + ("{" + label_txt + "}" if label_txt else "") + " " + str(value))
+
+        add("job_seconds", "gauge", "Time taken by the last job", [[{"job": job}, round(duration, 6)]])
+        add("fetch_seconds", "gauge", "Time taken to get each page in the last job", [[{"page": txt}, round(value, 6)] for txt, value in metrics.get("fetch_seconds", {}).items()])
+        add("fetch_bytes", "gauge", "Size of each page downloaded in the last job", [[{"page": txt}, value] for txt, value in metrics.get("fetch_bytes", {}).items()])
+        add("parse_seconds", "gauge", "Time taken to pull the values out of each page in the last job", [[{"page": txt}, round(value, 6)] for txt, value in metrics.get("parse_seconds", {}).items()])
+        add("shelve_seconds", "gauge", "Time spent reading and writing the save file in the last job", [[{}, round(metrics.get("shelve_seconds", 0), 6)]])
+        add("shelve_opens", "gauge", "Times the save file was opened in the last job", [[{}, metrics.get("shelve_opens", 0)]])
+        add("sensors_total", "counter", "Sensors sent to HA, and skipped as unchanged, since the app started", [[{"result": "published"}, self.metric_totals["published"]], [{"result": "skipped"}, self.metric_totals["skipped"]]])
+        add("requests_total", "counter", "Page requests since the app started", [[{}, self.metric_totals["requests"]]])
+        add("bytes_total", "counter", "Bytes downloaded since the app started", [[{}, self.metric_totals["bytes"]]])
+
+        #write to a temporary file first, so the collector never reads half a file
+        try:
+            with open(self.PROM_FILE + ".tmp", "w") as prom_file:
+                prom_file.write("\n".join(lines) + "\n")
+            os.replace(self.PROM_FILE + ".tmp", self.PROM_FILE)
+        except OSError as e:
+            self.log("couldn't write " + self.PROM_FILE + " - " + repr(e), level="WARNING")
     
-    #request the website information
-    def get_html_data(self):
-        #build the url for the correct country and area
-        start_url = self.url_base + "/" + self.URL_LANG + "/" + urllib.parse.quote(self.URL_COUNTRY) + "/" + urllib.parse.quote(self.URL_CITY) + "/" + self.URL_POSTCODE
-        
-        #for each of the basic pages (asthma, arthritis, migraine and sinus)
-        for sets in self.url_txt_sets:
-            #build the url for this allergy type
-            data_url = start_url + sets[0] + self.URL_ID
-            #call the function to get the information and put it in the text file
-            self.get_data(data_url, sets[1])
-
-        #for each of the multi-tier pages (allergies and cold/flu)
-        for sets in self.url_txt_xtd:
-            #build the url for this allergy type
-            data_url = start_url + sets[0] + self.URL_ID + sets[1]
-            #call the function to get the information and put it in the text file
-            self.get_data(data_url, sets[2])
-        
-    #request the website information and write it to a file
-    def get_data(self, url, txt):
-        # request the rendered html
-        self.log("request " + url)
-        data_from_website = self.get_html(url) 
-        # write the html into the local shelve file
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            allergies_db[txt] = data_from_website
-        #write out the get sensor
-        self.set_get_sensor()
-        #update the sensor
-        self.create_get_sensor()
-
-    def set_get_sensor(self):
-        #create a sensor to keep track last time this was run
-        tim = datetime.datetime.now()
-        date_time = tim.strftime("%d/%m/%Y, %H:%M:%S")
-        #add date time to the save file
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            allergies_db["updated"] = date_time
-
-    def create_get_sensor(self):
+    #close the shared session when appdaemon stops the app
+    def terminate(self):
+        if self.worker is not None:
+            self.worker.shutdown(wait=False, cancel_futures=True)
+        self.close_pipeline()
+
+    def create_get_sensor(self, loc, date_time=None):
         #get last update date time from the save file 
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            date_time = allergies_db["updated"]
+        if date_time is None:
+            if self.acc_data is None:
+                self.load_data()
+            date_time = self.acc_data.get(loc["key"] + "updated", "Unknown")
         #create the sensor
-        self.set_state("sensor.acc_data_last_sourced", state=date_time, replace=True, attributes={"icon": "mdi:timeline-clock-outline", "friendly_name": "ACC Allergy Data last sourced"})
-
-    #get the html from the website
-    def get_html(self, url):
-        #create request for getting information from the accuweather website
-        response = requests.request("GET", url, headers=self.headers, data = self.payload)
-        #scrape and return the rendered html
-        return response.text.encode('utf8')
+        #a copy, as the fetch threads can be adding to it
+        failed = sorted(txt[len(loc["key"]):] for txt in list(self.failed_pages) if txt.startswith(loc["key"]) and "/" not in txt[len(loc["key"]):])
+        self.publish_state("sensor." + loc["prefix"] + "_data_last_sourced", date_time, {"icon": "mdi:timeline-clock-outline", "friendly_name": loc["name"] + "ACC Allergy Data last sourced", "status": self.refresh_status, "failed_pages": failed})
+
+    #show how the refresh is going on the last sourced sensors
+    def set_refresh_status(self, status):
+        self.refresh_status = status
+        for loc in self.locations:
+            self.create_get_sensor(loc)
+        self.publish_states()
+
+    #queue a sensor to be sent to HA at the end of the cycle
+    def publish_state(self, senid, state, attributes):
+        if self.pending_states is None:
+            self.pending_states = {}
+        self.pending_states[senid] = [state, attributes]
+
+    #send the sensors queued this cycle to HA, skipping any that haven't changed since they were last sent
+    def publish_states(self):
+        if self.published is None:
+            self.published = {}
+        pending = self.pending_states or {}
+        self.pending_states = {}
+        sent = 0
+        for senid in pending:
+            if self.published.get(senid) != pending[senid]:
+                state, attributes = pending[senid]
+                self.set_state(senid, state=state, replace=True, attributes=attributes)
+                self.published[senid] = pending[senid]
+                sent += 1
+                self.add_metric("published", 1)
+            else:
+                self.add_metric("skipped", 1)
+        #let the caller know if anything was sent
+        return sent
+
+    #HA has restarted, so it no longer has any of the sensors
+    def ha_restarted(self, event_name, data, kwargs):
+        self.run_in_worker(self.ha_restarted_run)
+
+    def ha_restarted_run(self):
+        self.published = {}
+        self.start_sensors()
 
     # call the processes to create the sensors
     def set_acc_sensors(self, entity, attribute, old, new, kwargs):
+        self.run_in_worker(self.set_acc_sensors_run)
+
+    def set_acc_sensors_run(self):
+        #reread the save file, and send every sensor again
+        self.load_data()
+        self.published = {}
         #load all the sensors
-        self.load_sensors()
-        #turn off the flag
-        self.turn_off(self.DEB_FLAG)
+        try:
+            self.load_sensors()
+        finally:
+            #turn off the flag
+            self.turn_off(self.DEB_FLAG)
+
+    #send the sensors from the snapshot if it is for the same locations, otherwise build them from the save file
+    def start_sensors(self):
+        if not self.restore_snapshot():
+            self.load_sensors()
+
+    #what the snapshot was made for, so a change to the locations or to the pages stored since builds the sensors again
+    def snapshot_key(self, page_meta=None):
+        if page_meta is None:
+            page_meta = self.page_meta
+        key = []
+        for loc in self.locations:
+            hashes = [page_meta.get(loc["key"] + txt, {}).get("hash") for txt in self.get_page_names(loc)]
+            key.append([loc["prefix"], loc["name"], loc["url_id"], loc["web_ver"], loc["start_url"], hashes])
+        return key
+
+    def restore_snapshot(self):
+        start = time.perf_counter()
+        try:
+            with open(self.SNAPSHOT_FILE) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return False
+        #only the page hashes and last sourced times are read from the save file, not the pages
+        if self.acc_data is None:
+            stored = self.read_stored(["page_meta"] + [loc["key"] + "updated" for loc in self.locations])
+            if stored is None:
+                return False
+            page_meta = stored.get("page_meta", {})
+        else:
+            stored = self.acc_data
+            page_meta = self.page_meta
+        if snapshot.get("locations") != self.snapshot_key(page_meta):
+            return False
+        for senid, sensor in snapshot["sensors"].items():
+            self.publish_state(senid, sensor[0], sensor[1])
+        #the last sourced time changes with every refresh, even when the pages don't, so it is sent from the save file
+        for loc in self.locations:
+            self.create_get_sensor(loc, stored.get(loc["key"] + "updated", "Unknown"))
+        self.publish_states()
+        self.snapshot_saved = snapshot["locations"]
+        self.add_metric("snapshot_seconds", time.perf_counter() - start)
+        return True
+
+    #write the sensors as sent to HA, to a new file first so a half written snapshot is never read
+    def save_snapshot(self):
+        start = time.perf_counter()
+        key = self.snapshot_key()
+        try:
+            with open(self.SNAPSHOT_FILE + ".tmp", "w") as snapshot_file:
+                json.dump({"locations": key, "sensors": self.published}, snapshot_file)
+            os.replace(self.SNAPSHOT_FILE + ".tmp", self.SNAPSHOT_FILE)
+            self.snapshot_saved = key
+        except OSError as problem:
+            self.log("snapshot not saved: " + str(problem))
+        self.add_metric("snapshot_seconds", time.perf_counter() - start)
 
     # this loads the first time run and on a restart of appdaemon
     def load_sensors(self):    
+        #read the save file once for all the sensors, unless it is already in memory
+        if self.acc_data is None:
+            self.load_data()
+
+        #send the sensors for anything already stored straight away
+        ready = [loc for loc in self.locations if loc["key"] + "updated" in self.acc_data]
+        self.build_sensors(ready)
+
         #if no current data files
-        collect_flag = 0
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            #self.log(allergies_db[self.url_txt_sets[0][1]])
-            if "updated" not in allergies_db:
-                collect_flag = 1
-                
-        if collect_flag == 1:
+        if len(ready) < len(self.locations):
             self.get_html_data()
             self.log("get")
+            self.build_sensors(self.locations)
 
-        #create the sensors
-        
-        if self.WEB_VER == "APRIL22":
-            self.get_vals(self.url_txt_sets[0][1])
-            self.get_allergies_air_info(self.url_txt_sets[1][1])
-        else:
-            #pollens etc
-            self.get_allergies_rag_info(self.url_txt_xtd[0][2])
-            self.get_allergies_grass_info(self.url_txt_xtd[1][2])
-            self.get_allergies_tree_info(self.url_txt_xtd[2][2])
-            self.get_allergies_mold_info(self.url_txt_xtd[3][2])
-            self.get_allergies_dust_info(self.url_txt_xtd[4][2])
-            #cold and flu
-            self.get_coldflu_cold_info(self.url_txt_xtd[5][2])        
-            self.get_coldflu_flu_info(self.url_txt_xtd[6][2])
-            #air quality
-            self.get_allergies_air_info(self.url_txt_sets[4][1])
-            #asthma
-            self.get_asthma_info(self.url_txt_sets[0][1])
-            #arthritis
-            self.get_arthritis_info(self.url_txt_sets[1][1])
-            #migraine
-            self.get_migraine_info(self.url_txt_sets[2][1])
-            #sinus
-            self.get_sinus_info(self.url_txt_sets[3][1])
+    #create the sensors for each of the stored pages of the locations
+    def build_sensors(self, locations):
+        #with a process pool, parse any pages that need it all together first
+        if self.PARSE_PROCESSES > 0:
+            self.warm_parse_cache(locations)
+        try:
+            for loc in locations:
+                for txt in self.get_page_names(loc):
+                    if txt in self.sensor_txt_set:
+                        self.get_sensor_info(loc, txt)
+                    else:
+                        #the health activities page holds all the indexes
+                        self.get_vals(loc, txt)
+        finally:
+            #keep all of today's values in one write
+            if self.history is not None:
+                self.history.save()
+
+        #store any newly parsed values
+        self.save_parse_cache()
 
         #update the last updated sensor
-        self.create_get_sensor()
-
-    # this runs each morning
-    def daily_load_sensors(self, kwargs):    
-        #get data
-        self.get_html_data()
-
-        #load sensors
-        self.load_sensors()
-
-    def get_vals(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-        
-        myvals = soup.find_all("div", "index-name")
-        mytext = soup.find_all("div", "index-status-text")
-
-
+        for loc in self.locations:
+            self.create_get_sensor(loc)
+        #send all the changed sensors to HA, and keep a snapshot of them if they or the stored pages have changed
+        #the last sourced sensors are sent during a refresh, so new pages don't always mean new sensors here
+        if self.publish_states() or self.snapshot_saved != self.snapshot_key():
+            self.save_snapshot()
+
+    # this runs whenever a page is due
+    def refresh_due(self, kwargs):    
+        self.run_in_worker(self.refresh_due_run)
+
+    def refresh_due_run(self):
+        try:
+            if self.acc_data is None:
+                self.load_data()
+            #get the pages due in the next few minutes all together
+            soon = time.time() + 300
+            due = [loc["key"] + txt for loc in self.locations for txt in self.get_page_names(loc) if self.page_meta.get(loc["key"] + txt, {}).get("next", 0) <= soon]
+            if due:
+                #get data, and tidy up the save file once a day
+                today = datetime.date.today()
+                changed = self.get_html_data(compact=self.compacted != today, only=due)
+                self.compacted = today
+
+                #load sensors, if the website had anything new
+                if changed:
+                    self.load_sensors()
+        finally:
+            self.schedule_refresh()
+
+    #set the timer for when the next page is due
+    def schedule_refresh(self):
+        next_times = [self.page_meta.get(loc["key"] + txt, {}).get("next", 0) for loc in self.locations for txt in self.get_page_names(loc)]
+        wait = min(next_times) - time.time()
+        #no sooner than a minute, and at least once a day
+        wait = int(min(86400, max(60, wait)))
+        if self.refresh_handle is not None and self.timer_running(self.refresh_handle):
+            self.cancel_timer(self.refresh_handle)
+        self.refresh_handle = self.run_in(self.refresh_due, wait)
+
+    def get_vals(self, loc, txt):
+
+        #get the values from the health activities information in the save file
+        page = txt
+        myvals, mytext = self.get_page_vals(loc["key"] + page, "health")
+
+
+        seen = set()
         for val, txt in zip(myvals, mytext):
-            #create the hassio sensors for today and tomorrow for ragweed        
-                senid = "sensor.acc_" + val.text.strip().lower().replace(" ","_").replace("&","and")  + "_today"
+            #create the hassio sensors for today, the first card of each index if the page has it more than once
+                idx = val.strip().lower().replace(" ","_").replace("&","and")
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                senid = "sensor." + loc["prefix"] + "_" + idx  + "_today"
                 self.log(senid)
-                if val.text in self.icon_txt_set:
-                    ticon = 'mdi:' + self.icon_txt_set[val.text]
+                if val in self.icon_txt_set:
+                    ticon = 'mdi:' + self.icon_txt_set[val]
                 else: 
                     ticon = 'mdi:air-purifier'
-                #self.set_state(senid, state=txt.text, replace=True, attributes={"icon": "mdi:air-purifier", "friendly_name": val.text + " Today"})
-                self.set_state(senid, state=txt.text, replace=True, attributes={"icon": ticon, "friendly_name": val.text + " Today"})
-
-
-    #get the info for pollens - ragweed, grass, tree, mold, dust and air quality
-    def get_allergies_air_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-
-        soup = BeautifulSoup(html_info, "html.parser")
-        
-        myvals = soup.find_all("div", "aq-number")
-        mytext = soup.find_all("p", "category-text")
-        mystate = soup.find_all("p", "statement")
-        
-
-        #create the hassio sensors for today and tomorrow for ragweed        
-        if(len(myvals) > 1):
-            self.set_state("sensor.acc_air_today", state=myvals[0].text, replace=True, attributes={"icon": "mdi:air-purifier", "friendly_name": "Air Quality Today", "today_air_value": myvals[0].text + " - " + mytext[0].text , "today_air_phrase": mystate[0].text })
-            self.set_state("sensor.acc_air_tomorrow", state=myvals[2].text, replace=True, attributes={"icon": "mdi:air-purifier", "friendly_name": "Air Quality Tomorrow", "tomorrow_air_value": myvals[2].text + " - " + mytext[2].text , "tomorrow_air_phrase": mystate[2].text })
-        else:
-            self.set_state("sensor.acc_air_today", state='Unknown', replace=True, attributes={"icon": "mdi:air-purifier", "friendly_name": "Air Quality Today", "today_air_value": 'Unknown' , "today_air_phrase": 'Unknown' })
-            self.set_state("sensor.acc_air_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:air-purifier", "friendly_name": "Air Quality Tomorrow", "tomorrow_air_value": 'Unknown' , "tomorrow_air_phrase": 'Unknown' })
-
-        
-    #get the info for pollens - ragweed, grass, tree, mold, dust and air quality
-    def get_allergies_rag_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-        
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-
-        #create the hassio sensors for today and tomorrow for ragweed        
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_ragweed_pollen_today", state=myvalseta, replace=True, attributes={"icon": "mdi:clover", "friendly_name": "Ragweed Pollen Today", "today_ragweed_value": myvals[0].text , "today_ragweed_phrase": myconds[0].text })
-            self.set_state("sensor.acc_ragweed_pollen_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:clover", "friendly_name": "Ragweed Pollen Tomorrow", "tomorrow_ragweed_value": myvals[1].text , "tomorrow_ragweed_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_ragweed_pollen_today", state='Unknown', replace=True, attributes={"icon": "mdi:clover", "friendly_name": "Ragweed Pollen Today", "today_ragweed_value": 'Unknown' , "today_ragweed_phrase": 'Unknown' })
-            self.set_state("sensor.acc_ragweed_pollen_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:clover", "friendly_name": "Ragweed Pollen Tomorrow", "tomorrow_ragweed_value": 'Unknown' , "tomorrow_ragweed_phrase": 'Unknown' })
-
-
-    #get the info for pollens - ragweed, grass, tree, mold, dust and air quality
-    def get_allergies_grass_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-        
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-
-        #create the hassio sensors for today and tomorrow for ragweed        
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_grass_pollen_today", state=myvalseta, replace=True, attributes={"icon": "mdi:barley", "friendly_name": "Grass Pollen Today", "today_grass_value": myvals[0].text , "today_grass_phrase": myconds[0].text })
-            self.set_state("sensor.acc_grass_pollen_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:barley", "friendly_name": "Grass Pollen Tomorrow", "tomorrow_grass_value": myvals[1].text , "tomorrow_grass_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_grass_pollen_today", state='Unknown', replace=True, attributes={"icon": "mdi:barley", "friendly_name": "Grass Pollen Today", "today_grass_value": 'Unknown' , "today_grass_phrase": 'Unknown' })
-            self.set_state("sensor.acc_grass_pollen_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:barley", "friendly_name": "Grass Pollen Tomorrow", "tomorrow_grass_value": 'Unknown' , "tomorrow_grass_phrase": 'Unknown' })
-
-        
-    #get the info for pollens - ragweed, grass, tree, mold, dust and air quality
-    def get_allergies_tree_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-        
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-
-        #create the hassio sensors for today and tomorrow for ragweed        
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_tree_pollen_today", state=myvalseta, replace=True, attributes={"icon": "mdi:tree-outline", "friendly_name": "Tree Pollen Today", "today_tree_value": myvals[0].text , "today_tree_phrase": myconds[0].text })
-            self.set_state("sensor.acc_tree_pollen_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:tree-outline", "friendly_name": "Tree Pollen Tomorrow", "tomorrow_tree_value": myvals[1].text , "tomorrow_tree_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_tree_pollen_today", state='Unknown', replace=True, attributes={"icon": "mdi:tree-outline", "friendly_name": "Tree Pollen Today", "today_tree_value": 'Unknown' , "today_tree_phrase": 'Unknown' })
-            self.set_state("sensor.acc_tree_pollen_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:tree-outline", "friendly_name": "Tree Pollen Tomorrow", "tomorrow_tree_value": 'Unknown' , "tomorrow_tree_phrase": 'Unknown' })
-
-
-    #get the info for pollens - ragweed, grass, tree, mold, dust and air quality
-    def get_allergies_mold_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-        
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-
-        #create the hassio sensors for today and tomorrow for ragweed        
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_mold_today", state=myvalseta, replace=True, attributes={"icon": "mdi:bacteria-outline", "friendly_name": "Mold Today", "today_mold_value": myvals[0].text , "today_mold_phrase": myconds[0].text })
-            self.set_state("sensor.acc_mold_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:bacteria-outline", "friendly_name": "Mold Tomorrow", "tomorrow_mold_value": myvals[1].text , "tomorrow_mold_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_mold_today", state='Unknown', replace=True, attributes={"icon": "mdi:bacteria-outline", "friendly_name": "Mold Today", "today_mold_value": 'Unknown' , "today_mold_phrase": 'Unknown' })
-            self.set_state("sensor.acc_mold_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:bacteria-outline", "friendly_name": "Mold Tomorrow", "tomorrow_mold_value": 'Unknown' , "tomorrow_mold_phrase": 'Unknown' })
-    
-
-    #get the info for pollens - ragweed, grass, tree, mold, dust and air quality
-    def get_allergies_dust_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-        
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-
-        #create the hassio sensors for today and tomorrow for ragweed        
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_dust_today", state=myvalseta, replace=True, attributes={"icon": "mdi:cloud-search-outline", "friendly_name": "Dust Today", "today_dust_value": myvals[0].text , "today_dust_phrase": myconds[0].text })
-            self.set_state("sensor.acc_dust_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:cloud-search-outline", "friendly_name": "Dust Tomorrow", "tomorrow_dust_value": myvals[1].text , "tomorrow_dust_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_dust_today", state='Unknown', replace=True, attributes={"icon": "mdi:cloud-search-outline", "friendly_name": "Dust Today", "today_dust_value": 'Unknown' , "today_dust_phrase": 'Unknown' })
-            self.set_state("sensor.acc_dust_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:cloud-search-outline", "friendly_name": "Dust Tomorrow", "tomorrow_dust_value": 'Unknown' , "tomorrow_dust_phrase": 'Unknown' })
-    
-    #get the info for cold and flu
-    def get_coldflu_cold_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-
-        #create the hassio sensors for today and tomorrow for cold        
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_common_cold_today", state=myvalseta, replace=True, attributes={"icon": "mdi:snowflake-alert", "friendly_name": "Common Cold Today", "today_common_value": myvals[0].text , "today_common_phrase": myconds[0].text })
-            self.set_state("sensor.acc_common_cold_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:snowflake-alert", "friendly_name": "Common Cold Tomorrow", "tomorrow_common_value": myvals[1].text , "tomorrow_common_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_common_cold_today", state='Unknown', replace=True, attributes={"icon": "mdi:snowflake-alert", "friendly_name": "Common Cold Today", "today_common_value": 'Unknown' , "today_common_phrase": 'Unknown' })
-            self.set_state("sensor.acc_common_cold_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:snowflake-alert", "friendly_name": "Common Cold Tomorrow", "tomorrow_common_value": 'Unknown' , "tomorrow_common_phrase": 'Unknown' })
-    
-
-    def get_coldflu_flu_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-
-        #create the hassio sensors for today and tomorrow for cold        
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_flu_today", state=myvalseta, replace=True, attributes={"icon": "mdi:bacteria", "friendly_name": "Flu Today", "today_flu_value": myvals[0].text , "today_flu_phrase": myconds[0].text })
-            self.set_state("sensor.acc_flu_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:bacteria", "friendly_name": "Flu Tomorrow", "tomorrow_flu_value": myvals[1].text , "tomorrow_flu_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_flu_today", state='Unknown', replace=True, attributes={"icon": "mdi:bacteria", "friendly_name": "Flu Today", "today_flu_value": 'Unknown' , "today_flu_phrase": 'Unknown' })
-            self.set_state("sensor.acc_flu_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:bacteria", "friendly_name": "Flu Tomorrow", "tomorrow_flu_value": 'Unknown' , "tomorrow_flu_phrase": 'Unknown' })
-        
-        
-    #get the info for asthma
-    def get_asthma_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-        
-        #create the hassio sensors for today and tomorrow for asthma
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_asthma_today", state=myvalseta, replace=True, attributes={"icon": "mdi:lungs", "friendly_name": "Asthma Today", "today_asthma_value": myvals[0].text , "today_asthma_phrase": myconds[0].text })
-            self.set_state("sensor.acc_asthma_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:lungs", "friendly_name": "Asthma Tomorrow", "tomorrow_asthma_value": myvals[1].text , "tomorrow_asthma_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_asthma_today", state='Unknown', replace=True, attributes={"icon": "mdi:lungs", "friendly_name": "Asthma Today", "today_asthma_value": 'Unknown' , "today_asthma_phrase": 'Unknown' })
-            self.set_state("sensor.acc_asthma_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:lungs", "friendly_name": "Asthma Tomorrow", "tomorrow_asthma_value": 'Unknown' , "tomorrow_asthma_phrase": 'Unknown' })
-        
-
-    #get the info for arthritis
-    def get_arthritis_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-        
-        #create the hassio sensors for today and tomorrow for arthritis
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_arthritis_today", state=myvalseta, replace=True, attributes={"icon": "mdi:bone", "friendly_name": "Arthritis Today", "today_arthritis_value": myvals[0].text , "today_arthritis_phrase": myconds[0].text })
-            self.set_state("sensor.acc_arthritis_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:bone", "friendly_name": "Arthritis Tomorrow", "tomorrow_arthritis_value": myvals[1].text , "tomorrow_arthritis_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_arthritis_today", state='Unknown', replace=True, attributes={"icon": "mdi:bone", "friendly_name": "Arthritis Today", "today_arthritis_value": 'Unknown' , "today_arthritis_phrase": 'Unknown' })
-            self.set_state("sensor.acc_arthritis_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:bone", "friendly_name": "Arthritis Tomorrow", "tomorrow_arthritis_value": 'Unknown' , "tomorrow_arthritis_phrase": 'Unknown' })
-
-    #get the info for migraine
-    def get_migraine_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-        
-        #create the hassio sensors for today and tomorrow for migraine
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_migraine_today", state=myvalseta, replace=True, attributes={"icon": "mdi:head-flash", "friendly_name": "Migraine Today", "today_migraine_value": myvals[0].text , "today_migraine_phrase": myconds[0].text })
-            self.set_state("sensor.acc_migraine_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:head-flash", "friendly_name": "Migraine Tomorrow", "tomorrow_migraine_value": myvals[1].text , "tomorrow_migraine_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_migraine_today", state='Unknown', replace=True, attributes={"icon": "mdi:head-flash", "friendly_name": "Migraine Today", "today_migraine_value": 'Unknown' , "today_migraine_phrase": 'Unknown' })
-            self.set_state("sensor.acc_migraine_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:head-flash", "friendly_name": "Migraine Tomorrow", "tomorrow_migraine_value": 'Unknown' , "tomorrow_migraine_phrase": 'Unknown' })
-        
-    
-    #get the info for sinus
-    def get_sinus_info(self, txt):
-
-        #open the file and read the allergies information
-        with shelve.open(self.ACC_FILE) as allergies_db:
-            html_info = allergies_db[txt]
-        #parse the file for the hmtl
-        soup = BeautifulSoup(html_info, "html.parser")
-
-        myvals = soup.find_all("div", "gauge")
-        myconds = soup.find_all("div", "cond")
-        
-        #create the hassio sensors for today and tomorrow for sinus
-        if(len(myvals) > 1):
-            myvalseta = self.cleanString(myvals[0].text.split('>'))
-            myvalsetb = self.cleanString(myvals[1].text.split('>'))
-            self.set_state("sensor.acc_sinus_today", state=myvalseta, replace=True, attributes={"icon": "mdi:head-remove-outline", "friendly_name": "Sinus Today", "today_sinus_value": myvals[0].text , "today_sinus_phrase": myconds[0].text })
-            self.set_state("sensor.acc_sinus_tomorrow", state=myvalsetb, replace=True, attributes={"icon": "mdi:head-remove-outline", "friendly_name": "Sinus Tomorrow", "tomorrow_sinus_value": myvals[1].text , "tomorrow_sinus_phrase": myconds[1].text })
-        else:
-            self.set_state("sensor.acc_sinus_today", state='Unknown', replace=True, attributes={"icon": "mdi:head-remove-outline", "friendly_name": "Sinus Today", "today_sinus_value": 'Unknown' , "today_sinus_phrase": 'Unknown' })
-            self.set_state("sensor.acc_sinus_tomorrow", state='Unknown', replace=True, attributes={"icon": "mdi:head-remove-outline", "friendly_name": "Sinus Tomorrow", "tomorrow_sinus_value": 'Unknown' , "tomorrow_sinus_phrase": 'Unknown' })
-
-     
\ No newline at end of file
+                attributes = {"icon": ticon, "friendly_name": loc["name"] + val + " Today"}
+                attributes.update(self.add_history(loc, page, idx, txt))
+                self.publish_state(senid, txt, attributes)
+
+
+    #get the info for any of the pages in the sensor table - pollens, cold, flu, asthma, arthritis, migraine, sinus and air quality
+    def get_sensor_info(self, loc, txt):
+        page_type, senid, name, icon, prefix = self.sensor_txt_set[txt]
+
+        #get the values from the information in the save file
+        vals = self.get_page_vals(loc["key"] + txt, page_type)
+        days = self.get_day_vals(page_type, vals)
+
+        #create the hassio sensors for today and tomorrow
+        for day, title in zip(["today", "tomorrow"], ["Today", "Tomorrow"]):
+            if days is not None:
+                state, value, phrase = days[day]
+            else:
+                state, value, phrase = 'Unknown', 'Unknown', 'Unknown'
+            attributes = {"icon": "mdi:" + icon, "friendly_name": loc["name"] + name + " " + title, day + "_" + prefix + "_value": value, day + "_" + prefix + "_phrase": phrase}
+            #only today's value goes into the history, tomorrow's is still a forecast
+            if day == "today" and days is not None:
+                attributes.update(self.add_history(loc, txt, senid, state))
+            self.publish_state("sensor." + loc["prefix"] + "_" + senid + "_" + day, state, attributes)
+
+    #keep today's value of an index, and return its averages over time to show on the sensor
+    def add_history(self, loc, txt, idx, value):
+        if self.history is None:
+            return {}
+        #the values on a page are for the day it was downloaded
+        try:
+            date = datetime.date.fromisoformat(self.page_meta[loc["key"] + txt]["fetched"])
+        except KeyError:
+            date = datetime.date.today()
+        try:
+            self.history.add(loc["prefix"], idx, date, value)
+            return self.history.stats(loc["prefix"], idx, date)
+        except sqlite3.Error as problem:
+            self.log("history not kept for " + loc["prefix"] + " " + idx + ": " + str(problem))
+            return {}
+
+    #the values kept for an index between two dates, as [date, value, number]
+    def get_history(self, location, idx, start, end):
+        if self.history is None:
+            return []
+        return self.history.get(location, idx, start, end)
@@ -0,0 +1,1243 @@
+############################################################
+#
+# The part of the Accuweather allergies app that gets the pages,
+# keeps them in the save file and reads the values out of them
+#
+# used by accu_allergies.py in AppDaemon, and can be run on its
+# own to get or replay the pages for any number of locations and
+# print the values as JSON
+#
+#   python accu_pipeline.py --location au/canberra/21921
+#   python accu_pipeline.py --config apps.yaml --app accu_allergies --profile
+#   python accu_pipeline.py --config apps.yaml --replay
+#
+############################################################
+
+# import the function libraries
+from html.parser import HTMLParser
+import argparse
+import json
+import codecs
+import datetime
+import shelve
+import dbm
+import hashlib
+import zlib
+import time
+import random
+import re
+import threading
+import multiprocessing
+import os
+import sys
+import tempfile
+import sqlite3
+import contextlib
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+#requests and lxml take a while to load, so they are only loaded when a page is first got or read
+requests = None
+#lxml is optional, it is much faster at finding the values, otherwise the built in parser is used
+lxml = None
+etree = None
+lxml_tried = False
+
+def load_requests():
+    global requests
+    if requests is None:
+        import requests as loaded
+        requests = loaded
+    return requests
+
+def load_lxml():
+    global lxml, etree, lxml_tried
+    if not lxml_tried:
+        lxml_tried = True
+        try:
+            import lxml.html
+            from lxml import etree
+        except ImportError:
+            lxml = None
+    return lxml
+
+#tags that never have a closing tag
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+#tags whose contents are not page text
+SKIP_TAGS = {"script", "style", "template"}
+
+#compiled xpath for each [tag, class] pair, built the first time it is needed
+xpath_cache = {}
+#compiled pattern for finding each [tag, class] pair in a page without parsing it, for html as text and as bytes
+marker_cache = {}
+
+#does the page have the tag with the class as one of its classes, not just as part of another like gauge-value
+def has_find(html_info, tag, cls):
+    key = (tag, cls, isinstance(html_info, bytes))
+    if key not in marker_cache:
+        pattern = "<" + tag + r"\s(?:[^>]*\s)?class=[\"'](?:[^\"'>]*\s)?" + re.escape(cls) + r"[\"'\s]"
+        if key[2]:
+            pattern = pattern.encode("utf8")
+        marker_cache[key] = re.compile(pattern, re.IGNORECASE)
+    return marker_cache[key].search(html_info) is not None
+
+#get the text of each of the wanted [tag, class] elements in a page, in page order
+def extract_vals(html_info, finds):
+    if not html_info:
+        return [[] for find in finds]
+
+    #the pages are stored as utf8, which lxml would read as latin-1 when the page doesn't give its charset
+    if isinstance(html_info, bytes):
+        html_info = html_info.decode("utf8", "replace")
+
+    if load_lxml() is not None:
+        try:
+            doc = lxml.html.fromstring(html_info)
+        except etree.ParserError:
+            #nothing but whitespace or comments
+            return [[] for find in finds]
+        vals = []
+        for tag, cls in finds:
+            if (tag, cls) not in xpath_cache:
+                xpath_cache[(tag, cls)] = etree.XPath("//" + tag + "[contains(concat(' ', normalize-space(@class), ' '), ' " + cls + " ')]")
+            vals.append([found.text_content() for found in xpath_cache[(tag, cls)](doc)])
+        return vals
+
+    parser = Accu_Page_Parser(finds)
+    parser.feed(html_info)
+    parser.close()
+    return parser.vals
+
+
+#extract_vals and how long it took, for running in another process
+def timed_extract_vals(html_info, finds):
+    start = time.perf_counter()
+    vals = extract_vals(html_info, finds)
+    return vals, time.perf_counter() - start
+
+
+#reads through a page and keeps only the text of the wanted elements, without building the whole page
+class Accu_Page_Parser(HTMLParser):
+
+    def __init__(self, finds, enough=None):
+        super().__init__(convert_charrefs=True)
+        self.finds = finds
+        #how many of each find are needed before the rest of the page can be skipped, None to read it all
+        self.enough = enough
+        self.find_tags = {find[0] for find in finds}
+        #the text found for each of the finds
+        self.vals = [[] for find in finds]
+        #the tags currently open
+        self.stack = []
+        #the wanted elements currently open, as [find index, position in vals, stack depth, text]
+        self.open_finds = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(tag)
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        if tag in self.find_tags:
+            classes = []
+            for name, value in attrs:
+                if name == "class" and value:
+                    classes = value.split()
+            for i, find in enumerate(self.finds):
+                if find[0] == tag and find[1] in classes:
+                    #hold its place so the values stay in page order
+                    self.vals[i].append("")
+                    self.open_finds.append([i, len(self.vals[i]) - 1, len(self.stack), []])
+
+    def handle_endtag(self, tag):
+        #ignore closing tags that were never opened
+        if tag not in self.stack:
+            return
+        #close everything down to the matching tag
+        while self.stack:
+            closed = self.stack.pop()
+            if closed in SKIP_TAGS:
+                self.skip -= 1
+            while self.open_finds and self.open_finds[-1][2] > len(self.stack):
+                self.close_find()
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skip == 0:
+            for found in self.open_finds:
+                found[3].append(data)
+
+    def close_find(self):
+        i, pos, depth, text = self.open_finds.pop()
+        self.vals[i][pos] = "".join(text)
+
+    def close(self):
+        super().close()
+        #anything left open runs to the end of the page
+        while self.open_finds:
+            self.close_find()
+
+    #all the wanted elements have been seen and closed
+    def done(self):
+        if self.enough is None or self.open_finds:
+            return False
+        return all(len(vals) >= self.enough for vals in self.vals)
+
+
+#the same as Accu_Page_Parser using lxml, which is much faster for a page read a bit at a time
+class Accu_Lxml_Parser:
+
+    def __init__(self, finds, enough=None):
+        self.finds = finds
+        self.enough = enough
+        self.vals = [[] for find in finds]
+        #only the tags being looked for are handed back
+        self.parser = etree.HTMLPullParser(events=("end",), tag=list({find[0] for find in finds}))
+
+    def feed(self, data):
+        self.parser.feed(data)
+        self.read_events()
+
+    #an element is only handed over once it is closed, so its text is complete
+    def read_events(self):
+        for event, element in self.parser.read_events():
+            classes = (element.get("class") or "").split()
+            for i, find in enumerate(self.finds):
+                if element.tag == find[0] and find[1] in classes:
+                    self.vals[i].append("".join(element.itertext()))
+
+    def close(self):
+        try:
+            self.parser.close()
+        except etree.LxmlError:
+            #nothing but whitespace or comments
+            pass
+        self.read_events()
+
+    def done(self):
+        if self.enough is None:
+            return False
+        return all(len(vals) >= self.enough for vals in self.vals)
+
+
+#a parser that can be given a page a bit at a time, lxml if it is installed
+def page_parser(finds, enough=None):
+    if load_lxml() is not None:
+        return Accu_Lxml_Parser(finds, enough)
+    return Accu_Page_Parser(finds, enough)
+
+
+#levels used on the newer pages, turned into numbers so they can be averaged
+LEVEL_NUMBERS = {"low": 1, "moderate": 2, "high": 3, "very high": 4, "extreme": 5,
+                 "poor": 1, "fair": 2, "good": 3, "very good": 4, "excellent": 5}
+
+
+#keeps the value of each index for each day in a small sqlite file, for averages over time
+class Accu_History:
+
+    def __init__(self, path):
+        self.path = path
+        self.db = None
+
+    #open the file the first time it is needed, so it is used from the thread that does the work
+    def open(self):
+        if self.db is None:
+            self.db = self.connect()
+        return self.db
+
+    #one row per location, index and day, kept in that order on disk so a date range is a single scan
+    def connect(self):
+        db = sqlite3.connect(self.path)
+        db.execute("CREATE TABLE IF NOT EXISTS history (location TEXT, idx TEXT, date TEXT, value TEXT, number REAL, PRIMARY KEY (location, idx, date)) WITHOUT ROWID")
+        return db
+
+    #record the value for a day, a later value on the same day replaces the earlier one
+    def add(self, location, idx, date, value):
+        number = LEVEL_NUMBERS.get(value.strip().lower())
+        if number is None:
+            try:
+                number = float(value)
+            except ValueError:
+                number = None
+        self.open().execute("INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?)", (location, idx, date.isoformat(), value, number))
+
+    #write everything recorded in one go and let go of the file until the next refresh
+    def save(self):
+        if self.db is not None:
+            try:
+                self.db.commit()
+            finally:
+                self.db.close()
+                self.db = None
+
+    #the values recorded for an index between two dates, as [date, value, number]
+    #uses its own connection so other apps can ask while a refresh is writing
+    def get(self, location, idx, start, end):
+        with contextlib.closing(self.connect()) as db:
+            rows = db.execute("SELECT date, value, number FROM history WHERE location = ? AND idx = ? AND date >= ? AND date <= ? ORDER BY date", (location, idx, start.isoformat(), end.isoformat())).fetchall()
+        return [list(row) for row in rows]
+
+    #rolling averages up to a day, and the average and highest value so far this season
+    def stats(self, location, idx, date):
+        week = date - datetime.timedelta(days=6)
+        month = date - datetime.timedelta(days=29)
+        season = self.season_start(date)
+        row = self.open().execute("SELECT AVG(CASE WHEN date >= ? THEN number END), AVG(CASE WHEN date >= ? THEN number END), "
+                                  "AVG(CASE WHEN date >= ? THEN number END), MAX(CASE WHEN date >= ? THEN number END), COUNT(CASE WHEN date >= ? THEN number END) "
+                                  "FROM history WHERE location = ? AND idx = ? AND date >= ? AND date <= ?",
+                                  (week.isoformat(), month.isoformat(), season.isoformat(), season.isoformat(), season.isoformat(),
+                                   location, idx, min(month, season).isoformat(), date.isoformat())).fetchone()
+        return {"avg_7_days": self.rounded(row[0]), "avg_30_days": self.rounded(row[1]),
+                "season_avg": self.rounded(row[2]), "season_max": self.rounded(row[3]), "season_days": row[4]}
+
+    #seasons start on the first of march, june, september and december
+    def season_start(self, date):
+        month = date.month // 3 * 3
+        if month == 0:
+            return datetime.date(date.year - 1, 12, 1)
+        return datetime.date(date.year, month, 1)
+
+    def rounded(self, value):
+        if value is None:
+            return None
+        return round(value, 1)
+
+
+#pages downloaded by any app or appdaemon using the same file, so a page is only downloaded once while it is fresh
+#sqlite locks the file while it is being changed, so more than one app can use it at once
+class Accu_Page_Cache:
+
+    def __init__(self, path, ttl, max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    #a new connection each time, as the pages are got from several threads
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, fetched REAL, used REAL, etag TEXT, last_modified TEXT, size INTEGER, body BLOB)")
+        db.execute("CREATE INDEX IF NOT EXISTS pages_used ON pages (used)")
+        return db
+
+    #the page and its headers if another app got it recently enough, otherwise None
+    def get(self, url):
+        now = time.time()
+        with contextlib.closing(self.connect()) as db:
+            with db:
+                row = db.execute("SELECT etag, last_modified, body FROM pages WHERE url = ? AND fetched > ?", (url, now - self.ttl)).fetchone()
+                if row is None:
+                    return None
+                db.execute("UPDATE pages SET used = ? WHERE url = ?", (now, url))
+        return [zlib.decompress(row[2]), {"ETag": row[0], "Last-Modified": row[1]}]
+
+    #keep a page for the other apps, then drop the least recently used pages until the file is small enough again
+    def put(self, url, html_info, headers):
+        now = time.time()
+        body = zlib.compress(html_info)
+        with contextlib.closing(self.connect()) as db:
+            with db:
+                db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", (url, now, now, headers.get("ETag"), headers.get("Last-Modified"), len(body), body))
+                total = db.execute("SELECT SUM(size) FROM pages").fetchone()[0]
+                if total > self.max_bytes:
+                    drop = []
+                    for old_url, size in db.execute("SELECT url, size FROM pages WHERE url != ? ORDER BY used", (url,)):
+                        if total <= self.max_bytes:
+                            break
+                        drop.append([old_url])
+                        total -= size
+                    db.executemany("DELETE FROM pages WHERE url = ?", drop)
+
+#getting, keeping and reading the pages, with the settings read from self.args
+class Accu_Pipeline:
+
+    FETCH_WORKERS = 4
+    FETCH_TIMEOUT = 20
+    FETCH_DELAY = 0
+    FETCH_RETRIES = 2
+    FETCH_BACKOFF = 2
+    FETCH_STREAM = True
+    PARSE_PROCESSES = 0
+    SHARED_CACHE = ""
+    SHARED_CACHE_TTL = 3600
+    SHARED_CACHE_SIZE = 50
+    #stop asking for a page after it fails this many refreshes in a row, for a wait that doubles each time up to a day
+    BREAKER_FAILS = 3
+    BREAKER_WAIT = 3600
+    #shortest and longest time between asking for each page, in hours
+    REFRESH_MIN = 3
+    REFRESH_MAX = 24
+
+    #print the log to stderr when run on its own
+    verbose = False
+    #shared keep-alive session, created on first request
+    session = None
+    #the processes that parse the pages, if PARSE_PROCESSES is set
+    parse_pool = None
+    #how the current refresh is going, shown on the last sourced sensor
+    refresh_status = "idle"
+    #the locations to get information for
+    locations = None
+    #when the next page request can start, so requests are spread out
+    fetch_lock = None
+    next_fetch = 0
+    #failures in a row for each url, and when it can next be asked for - url: [failures, time]
+    breakers = None
+    #pages that couldn't be got in the last refresh
+    failed_pages = None
+    #timings and counts for the current job, added to from the fetch threads
+    metrics = None
+    metrics_lock = None
+    #pages shared with other apps
+    page_cache = None
+    #in memory copy of the shelve file, so the parsers don't reopen it for every page
+    acc_data = None
+    #values already pulled out of each page, keyed by page name and kept with a hash of the page
+    parse_cache = None
+    parse_cache_changed = False
+    #etag, last modified and hash of each stored page, for asking the website only for changed pages
+    page_meta = None
+
+    payload = {}
+    headers = {
+        'User-Agent': 'Mozilla/5.0'
+    }
+        
+    #"https://www.accuweather.com/URL_LANG/URL_COUNTRY/URL_CITY/URL_POSTCODE/health-activities/URL_ID"
+    #url building
+    url_base = "https://www.accuweather.com"
+    
+    # simple - asthma, arthritis, migraine, sinus
+    
+    url_txt_setsA = [["/asthma-weather/","asthma"], ["/arthritis-weather/","arthritis"], ["/migraine-weather/","migraine"], [ "/sinus-weather/","sinus"], ["/air-quality-index/", "air"]]
+    url_txt_setsB = [["/health-activities/","health"],["/air-quality-index/", "air"]]
+    # extended - cold, flu, ragweed pollen, grass pollen, tree pollen, mold, dust
+    #["/allergies-weather/","allergies"], ["/cold-flu-weather/","coldflu"]
+    url_txt_xtdA = [["/allergies-weather/", "?name=ragweed-pollen" , "ragweed"], ["/allergies-weather/", "?name=grass-pollen" , "grass"], ["/allergies-weather/", "?name=tree-pollen" , "tree"], ["/allergies-weather/", "?name=mold" , "mold"], ["/allergies-weather/", "?name=dust-dander" , "dust"], ["/cold-flu-weather/", "?name=common-cold" , "cold"], ["/cold-flu-weather/", "?name=flu" , "flu"]]
+    url_txt_xtdB = []
+
+    #the layouts the website has used for each type of page, newest first - [version, the values wanted from it as [tag, class]]
+    #a page's layout is the one with all of its values in the page, so add a new layout to the front when the website changes
+    page_layouts = {"gauge": [["PRE_APRIL22", [["div", "gauge"], ["div", "cond"]]]],
+                    "air": [["PRE_APRIL22", [["div", "aq-number"], ["p", "category-text"], ["p", "statement"]]]],
+                    "health": [["APRIL22", [["div", "index-name"], ["div", "index-status-text"]]]]}
+    #how many of each value are used from each type of page, so the rest can be skipped - the health page is always read to the end
+    page_enough = {"gauge": 2, "air": 3, "health": None}
+
+    #the sensors made from each page - page name: [type of page, sensor id, friendly name, icon, attribute name]
+    #adding another index is a new url entry above and a line here
+    sensor_txt_set = {"ragweed": ["gauge", "ragweed_pollen", "Ragweed Pollen", "clover", "ragweed"],
+                      "grass": ["gauge", "grass_pollen", "Grass Pollen", "barley", "grass"],
+                      "tree": ["gauge", "tree_pollen", "Tree Pollen", "tree-outline", "tree"],
+                      "mold": ["gauge", "mold", "Mold", "bacteria-outline", "mold"],
+                      "dust": ["gauge", "dust", "Dust", "cloud-search-outline", "dust"],
+                      "cold": ["gauge", "common_cold", "Common Cold", "snowflake-alert", "common"],
+                      "flu": ["gauge", "flu", "Flu", "bacteria", "flu"],
+                      "asthma": ["gauge", "asthma", "Asthma", "lungs", "asthma"],
+                      "arthritis": ["gauge", "arthritis", "Arthritis", "bone", "arthritis"],
+                      "migraine": ["gauge", "migraine", "Migraine", "head-flash", "migraine"],
+                      "sinus": ["gauge", "sinus", "Sinus", "head-remove-outline", "sinus"],
+                      "air": ["air", "air", "Air Quality", "air-purifier", "air"]}
+
+    def cleanString(self, s):
+        retstr = ""
+        for chars in s:
+                retstr += self.removeNonAscii(chars)
+        return retstr
+
+    def removeNonAscii(self, s): 
+        return ''.join(i for i in s if ord(i)<126 and ord(i)>31)    
+        
+
+    #build a location from its settings, anything not given comes from the top level settings
+    def get_location(self, loc_args):
+        def get_arg(name, default):
+            if name in loc_args:
+                return loc_args[name]
+            if name in self.args:
+                return self.args[name]
+            return default
+
+        url_id = str(get_arg("URL_ID", ""))
+        url_city = get_arg("URL_CITY", "")
+        #see if they have included a postcode value, if not, just use the ID value
+        url_postcode = str(get_arg("URL_POSTCODE", ""))
+        if url_postcode == "":
+            url_postcode = url_id
+        web_ver = get_arg("WEB_VER", "")
+
+        #the single location keeps the original sensor names and save file keys
+        if "LOCATIONS" in self.args:
+            prefix = loc_args.get("PREFIX", "acc_" + url_city.lower().replace(" ", "_").replace("-", "_"))
+        else:
+            prefix = "acc"
+        name = loc_args.get("NAME", "")
+
+        loc = {"prefix": prefix, "name": name + " " if name else "", "url_id": url_id, "web_ver": web_ver}
+        #pages for this location are kept under its own keys in the save file
+        loc["key"] = "" if prefix == "acc" else prefix + "/"
+        #build the url for the correct country and area
+        loc["start_url"] = self.url_base + "/" + get_arg("URL_LANG", "en") + "/" + urllib.parse.quote(get_arg("URL_COUNTRY", "")) + "/" + urllib.parse.quote(url_city) + "/" + url_postcode
+
+        #this supports the two website variations
+        if web_ver == "APRIL22":
+            loc["url_txt_sets"] = self.url_txt_setsB
+            loc["url_txt_xtd"] = self.url_txt_xtdB
+        else:
+            loc["url_txt_sets"] = self.url_txt_setsA
+            loc["url_txt_xtd"] = self.url_txt_xtdA
+        return loc
+
+    #add to a measurement for the current job, either a single number or one for each page
+    def add_metric(self, name, value, page=None):
+        with self.metrics_lock:
+            if self.metrics is None:
+                self.metrics = {}
+            if page is None:
+                self.metrics[name] = self.metrics.get(name, 0) + value
+            else:
+                self.metrics.setdefault(name, {})[page] = value
+
+    #request the website information
+    def get_html_data(self, compact=False, only=None):
+        page_list = []
+        for loc in self.locations:
+            start_url = loc["start_url"]
+            #for each of the basic pages (asthma, arthritis, migraine and sinus)
+            for sets in loc["url_txt_sets"]:
+                #build the url for this allergy type
+                page_list.append([start_url + sets[0] + loc["url_id"], loc["key"] + sets[1], sets[1]])
+
+            #for each of the multi-tier pages (allergies and cold/flu)
+            for sets in loc["url_txt_xtd"]:
+                #build the url for this allergy type
+                page_list.append([start_url + sets[0] + loc["url_id"] + sets[1], loc["key"] + sets[2], sets[2]])
+
+        #just the pages asked for
+        if only is not None:
+            page_list = [page for page in page_list if page[1] in only]
+
+        #the stored pages are needed to know what has changed
+        if self.acc_data is None:
+            self.load_data()
+        #the values from the pages before this refresh, to see if the forecasts have moved
+        before = {}
+        for page in page_list:
+            before[page[1]] = self.parse_cache.get(page[1], {}).get("vals")
+
+        #request the pages for every location at once, so a refresh only takes as long as the slowest page
+        self.set_refresh_status("refreshing 0/" + str(len(page_list)))
+        #make the session before the threads start, so they can't each make their own and leave the others open
+        self.get_session()
+        last_status = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.FETCH_WORKERS) as pool:
+            results = pool.map(lambda page: self.get_html(page[0], page[1], page[2]), page_list)
+            pages = {}
+            #the values found while the pages were read, so they don't need to be parsed again
+            streamed = {}
+            for done, (page, response) in enumerate(zip(page_list, results), 1):
+                #only show progress every few seconds, so a quick refresh doesn't fill up the recorder
+                if time.monotonic() - last_status >= 5:
+                    self.set_refresh_status("refreshing " + str(done) + "/" + str(len(page_list)))
+                    last_status = time.monotonic()
+                meta = self.page_meta.setdefault(page[1], {})
+                #the website says the page hasn't changed since last time, or it couldn't be got so the stored copy is kept
+                if response is None:
+                    continue
+                data_from_website, response_headers, vals = response
+                digest = hashlib.sha1(data_from_website).hexdigest()
+                #only keep the page if it is different to the stored one
+                if meta.get("hash") != digest or page[1] not in self.acc_data:
+                    pages[page[1]] = data_from_website
+                    if vals is not None:
+                        streamed[page[1]] = vals
+                    #the day this copy of the page came from, for the history of the values on it
+                    meta["fetched"] = datetime.date.today().isoformat()
+                meta.update({"etag": response_headers.get("ETag"), "last_modified": response_headers.get("Last-Modified"), "hash": digest})
+
+        #pull the values out of the new copies now, so they are ready for the sensors
+        parsed = self.parse_pages([[page[1], pages[page[1]], self.get_finds(page[1], self.get_page_type(page[2]), pages[page[1]])] for page in page_list if page[1] in pages and page[1] not in streamed])
+        parsed.update(streamed)
+
+        #work out when each page should next be asked for
+        for page in page_list:
+            moved = False
+            if page[1] in pages:
+                finds = self.get_finds(page[1], self.get_page_type(page[2]))
+                vals = parsed[page[1]]
+                self.parse_cache[page[1]] = {"hash": self.page_meta[page[1]]["hash"], "finds": finds, "vals": vals}
+                self.parse_cache_changed = True
+                moved = vals != before[page[1]]
+            #a page that couldn't be got hasn't shown whether its forecast is moving, so it keeps its interval
+            if page[1] in self.failed_pages:
+                self.set_retry_refresh(page[0], page[1])
+            else:
+                self.set_next_refresh(page[1], moved)
+
+        #write all the changed pages into the text file in one go
+        self.save_data(pages, compact)
+        #update the sensor
+        self.set_refresh_status("idle")
+        #let the caller know which pages changed
+        return list(pages)
+        
+    #write the website information to the file in a single open, with the updated time written last
+    def save_data(self, pages, compact=False):
+        #keep track of the last time this was run
+        tim = datetime.datetime.now()
+        date_time = tim.strftime("%d/%m/%Y, %H:%M:%S")
+        #keep the in memory copy in step with the file, with the pages compressed
+        for txt in pages:
+            self.acc_data[txt] = self.pack_page(pages[txt])
+        updated = [loc["key"] + "updated" for loc in self.locations]
+
+        if compact:
+            #drop pages for locations that are no longer set up
+            known = [loc["key"] + txt for loc in self.locations for txt in self.get_page_names(loc)]
+            for store in [self.acc_data, self.parse_cache, self.page_meta]:
+                for txt in list(store):
+                    if txt not in known and txt not in updated:
+                        del store[txt]
+            #write everything into a new file, so the space from old pages is given back
+            start = time.perf_counter()
+            compact_file = self.ACC_FILE + ".compact"
+            with shelve.open(compact_file, flag="n") as allergies_db:
+                for txt in self.acc_data:
+                    if txt not in updated:
+                        allergies_db[txt] = self.pack_page(self.acc_data[txt])
+                allergies_db["parsed"] = self.parse_cache
+                allergies_db["page_meta"] = self.page_meta
+                #add date time to the save file
+                for txt in updated:
+                    allergies_db[txt] = date_time
+            self.replace_save_file(compact_file)
+            self.parse_cache_changed = False
+        else:
+            # write the html into the local shelve file
+            start = time.perf_counter()
+            with shelve.open(self.ACC_FILE) as allergies_db:
+                for txt in pages:
+                    allergies_db[txt] = self.acc_data[txt]
+                allergies_db["page_meta"] = self.page_meta
+                #add date time to the save file
+                for txt in updated:
+                    allergies_db[txt] = date_time
+        self.add_metric("shelve_seconds", time.perf_counter() - start)
+        self.add_metric("shelve_opens", 1)
+
+        for txt in updated:
+            self.acc_data[txt] = date_time
+
+    #put a finished new save file in place of the old one
+    #the dbm behind shelve may use more than one file, eg allergies.dat and allergies.dir, which can't all be swapped at once
+    #so a marker file is written once the new files are on the disk, and a swap cut short by a power cut is finished the next time the file is read
+    def replace_save_file(self, new_file):
+        folder, name = os.path.split(new_file)
+        for file_name in os.listdir(folder or "."):
+            if file_name.startswith(name):
+                with open(os.path.join(folder, file_name), "rb") as new_part:
+                    os.fsync(new_part.fileno())
+        with open(self.ACC_FILE + ".swap", "w") as marker:
+            marker.write(name)
+            marker.flush()
+            os.fsync(marker.fileno())
+        self.sync_folder(folder)
+        self.finish_swap()
+
+    #move any new save files over the old ones, if a swap has been started
+    def finish_swap(self):
+        if not os.path.exists(self.ACC_FILE + ".swap"):
+            return
+        folder, name = os.path.split(self.ACC_FILE + ".compact")
+        for file_name in os.listdir(folder or "."):
+            if file_name.startswith(name):
+                os.replace(os.path.join(folder, file_name), self.ACC_FILE + file_name[len(name):])
+        self.sync_folder(folder)
+        os.remove(self.ACC_FILE + ".swap")
+        self.sync_folder(folder)
+
+    #make the renames in a folder stick, which windows doesn't need or allow
+    def sync_folder(self, folder):
+        try:
+            handle = os.open(folder or ".", os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(handle)
+        finally:
+            os.close(handle)
+
+    #compress a page for storing, pages stored before compression are compressed as they are rewritten
+    def pack_page(self, html_info):
+        if isinstance(html_info, bytes):
+            return ["zlib", zlib.compress(html_info)]
+        return html_info
+
+    #get the html back from a stored page
+    def unpack_page(self, stored):
+        if isinstance(stored, list) and stored[0] == "zlib":
+            return zlib.decompress(stored[1])
+        return stored
+
+    #read the whole save file once into memory for the parsers, read only for a file that belongs to another app
+    def load_data(self, read_only=False):
+        start = time.perf_counter()
+        if not read_only:
+            self.finish_swap()
+        with shelve.open(self.ACC_FILE, flag="r" if read_only else "c") as allergies_db:
+            self.acc_data = dict(allergies_db)
+        self.add_metric("shelve_seconds", time.perf_counter() - start)
+        self.add_metric("shelve_opens", 1)
+        #pick up the values already pulled out of the pages last time
+        self.parse_cache = self.acc_data.pop("parsed", {})
+        self.parse_cache_changed = False
+        self.page_meta = self.acc_data.pop("page_meta", {})
+        return self.acc_data
+
+    #read just a few values from the save file, without loading the pages, or None if it can't be read
+    def read_stored(self, keys):
+        start = time.perf_counter()
+        try:
+            self.finish_swap()
+            with shelve.open(self.ACC_FILE, flag="r") as allergies_db:
+                stored = {key: allergies_db[key] for key in keys if key in allergies_db}
+        except (OSError, *dbm.error):
+            return None
+        self.add_metric("shelve_seconds", time.perf_counter() - start)
+        self.add_metric("shelve_opens", 1)
+        return stored
+
+    #keep the values pulled out of the pages, so a restart doesn't have to parse them again
+    def save_parse_cache(self):
+        if self.parse_cache_changed:
+            start = time.perf_counter()
+            with shelve.open(self.ACC_FILE) as allergies_db:
+                allergies_db["parsed"] = self.parse_cache
+            self.parse_cache_changed = False
+            self.add_metric("shelve_seconds", time.perf_counter() - start)
+            self.add_metric("shelve_opens", 1)
+
+    #get the stored html for a page, without reopening the save file
+    def get_page(self, txt):
+        if self.acc_data is None:
+            self.load_data()
+        return self.unpack_page(self.acc_data.get(txt, b""))
+
+    #parse a list of [page, html, finds], in the process pool if there is one, returning the values for each page
+    def parse_pages(self, jobs):
+        if self.PARSE_PROCESSES == 0 or len(jobs) < 2:
+            results = [timed_extract_vals(html_info, finds) for txt, html_info, finds in jobs]
+        else:
+            if self.parse_pool is None:
+                #start the workers fresh rather than forking, as a fork of AppDaemon can copy a lock another thread is holding and hang
+                self.parse_pool = ProcessPoolExecutor(max_workers=self.PARSE_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+            #only the small lists of values come back from the other processes
+            results = list(self.parse_pool.map(timed_extract_vals, [job[1] for job in jobs], [job[2] for job in jobs]))
+        parsed = {}
+        for job, (vals, seconds) in zip(jobs, results):
+            self.add_metric("parse_seconds", seconds, job[0])
+            parsed[job[0]] = vals
+        return parsed
+
+    #parse every page the parse cache doesn't have in one go, so they can be spread over the process pool
+    def warm_parse_cache(self, locations):
+        if self.acc_data is None:
+            self.load_data()
+        jobs = []
+        digests = {}
+        for loc in locations:
+            for txt in self.get_page_names(loc):
+                finds = self.get_finds(loc["key"] + txt, self.get_page_type(txt))
+                cached = self.parse_cache.get(loc["key"] + txt)
+                digest = self.page_meta.get(loc["key"] + txt, {}).get("hash")
+                if cached is None or digest is None or cached["hash"] != digest or cached["finds"] != finds:
+                    html_info = self.get_page(loc["key"] + txt)
+                    digests[loc["key"] + txt] = digest or hashlib.sha1(html_info).hexdigest()
+                    jobs.append([loc["key"] + txt, html_info, self.get_finds(loc["key"] + txt, self.get_page_type(txt), html_info)])
+        parsed = self.parse_pages(jobs)
+        for txt, html_info, finds in jobs:
+            self.parse_cache[txt] = {"hash": digests[txt], "finds": finds, "vals": parsed[txt]}
+            self.parse_cache_changed = True
+
+    #the values wanted from a page - for the layout given the html, otherwise the layout it had last time, or the newest for a new page
+    def get_finds(self, txt, page_type, html_info=None):
+        layouts = self.page_layouts[page_type]
+        if html_info is not None:
+            finds = self.detect_layout(txt, page_type, html_info)
+            if finds is not None:
+                return finds
+        version = self.page_meta.get(txt, {}).get("layout")
+        for layout in layouts:
+            if layout[0] == version:
+                return layout[1]
+        return layouts[0][1]
+
+    #find the layout with all of its values in the page, trying the one the page had last time first, and remember it for the page
+    def detect_layout(self, txt, page_type, html_info):
+        meta = self.page_meta.setdefault(txt, {})
+        for version, finds in sorted(self.page_layouts[page_type], key=lambda layout: layout[0] != meta.get("layout")):
+            if all(has_find(html_info, tag, cls) for tag, cls in finds):
+                if meta.get("layout") not in [None, version]:
+                    self.log(txt + " changed layout from " + meta["layout"] + " to " + version)
+                meta["layout"] = version
+                return finds
+        return None
+
+    #get the text of each of the wanted elements in a page, only parsing the page if it has changed
+    def get_page_vals(self, txt, page_type):
+        if self.acc_data is None:
+            self.load_data()
+        #use the hash from when the page was downloaded, if there is one, so the page isn't decompressed
+        html_info = None
+        digest = self.page_meta.get(txt, {}).get("hash")
+        if digest is None:
+            html_info = self.get_page(txt)
+            digest = hashlib.sha1(html_info).hexdigest()
+
+        cached = self.parse_cache.get(txt)
+        if cached is not None and cached["hash"] == digest and cached["finds"] == self.get_finds(txt, page_type):
+            return cached["vals"]
+
+        #pull the values out of the hmtl
+        if html_info is None:
+            html_info = self.get_page(txt)
+        finds = self.get_finds(txt, page_type, html_info)
+        start = time.perf_counter()
+        vals = extract_vals(html_info, finds)
+        self.add_metric("parse_seconds", time.perf_counter() - start, txt)
+
+        self.parse_cache[txt] = {"hash": digest, "finds": finds, "vals": vals}
+        self.parse_cache_changed = True
+        return vals
+
+    #get the keep-alive session shared by all the page requests
+    def get_session(self):
+        if self.session is None:
+            load_requests()
+            session = requests.Session()
+            session.headers.update(self.headers)
+            #keep one connection per worker open to the website
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.FETCH_WORKERS)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self.session = session
+        return self.session
+
+    #get the html from the website, or None if it hasn't changed or couldn't be got, so the stored copy is kept
+    def get_html(self, url, txt, name):
+        #another app may have just got this page
+        cached = self.get_shared_page(url, txt)
+        if cached is not None:
+            return cached
+
+        #leave out pages that keep failing until their wait is over
+        failures, retry_time = self.breakers.get(url, [0, 0])
+        if failures >= self.BREAKER_FAILS and time.time() < retry_time:
+            self.log("skipping " + url + " after " + str(failures) + " failures")
+            self.failed_pages.add(txt)
+            return None
+
+        #ask the website to only send the page if it has changed
+        headers = {}
+        meta = self.page_meta.get(txt, {})
+        if txt in self.acc_data:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        for attempt in range(self.FETCH_RETRIES + 1):
+            if attempt > 0:
+                #wait longer after each try, with some randomness so the retries don't all line up
+                time.sleep(self.FETCH_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            self.wait_for_turn()
+            self.log("request " + url)
+            session = self.get_session()
+            start = time.perf_counter()
+            try:
+                #create request for getting information from the accuweather website
+                response = session.get(url, headers=headers, data = self.payload, timeout=self.FETCH_TIMEOUT, stream=self.FETCH_STREAM)
+                if response.status_code == 304:
+                    response.close()
+                    self.page_worked(url, txt)
+                    return None
+                finds = self.get_finds(txt, self.get_page_type(name))
+                data, vals = self.read_page(response, txt, name, finds)
+            except requests.RequestException as e:
+                problem = repr(e)
+                continue
+            except Exception as e:
+                #anything else, like a page that can't be read, fails just this page rather than the whole refresh
+                #it would only go wrong the same way again, so it isn't retried
+                problem = repr(e)
+                break
+            finally:
+                self.add_metric("fetch_seconds", time.perf_counter() - start, txt)
+            problem = self.check_page(response, data, txt, name)
+            if problem is None:
+                #the page has changed layout since last time, so the values found while reading it are for the wrong one
+                if self.get_finds(txt, self.get_page_type(name)) != finds:
+                    vals = None
+                self.page_worked(url, txt)
+                self.put_shared_page(url, data, response.headers)
+                #return the html, the headers and the values if they were found while reading it
+                return [data, response.headers, vals]
+            #only busy or server errors are worth trying again straight away
+            if response.status_code != 429 and response.status_code < 500:
+                break
+
+        self.page_failed(url, txt, problem)
+        return None
+
+    #the page from the shared cache as [html, headers, values], or None if it isn't there or is too old
+    def get_shared_page(self, url, txt):
+        if self.page_cache is None:
+            return None
+        try:
+            cached = self.page_cache.get(url)
+        except sqlite3.Error as problem:
+            self.log("shared cache not read: " + str(problem))
+            return None
+        if cached is None:
+            return None
+        self.add_metric("shared_cache_hits", 1)
+        self.page_worked(url, txt)
+        #the values are found when the page is parsed
+        return cached + [None]
+
+    def put_shared_page(self, url, html_info, headers):
+        if self.page_cache is None:
+            return
+        try:
+            self.page_cache.put(url, html_info, headers)
+        except sqlite3.Error as problem:
+            self.log("shared cache not written: " + str(problem))
+
+    #spread the requests out across all the locations
+    def wait_for_turn(self):
+        if self.FETCH_DELAY > 0:
+            with self.fetch_lock:
+                wait = self.next_fetch - time.monotonic()
+                self.next_fetch = max(self.next_fetch, time.monotonic()) + self.FETCH_DELAY
+            if wait > 0:
+                time.sleep(wait)
+
+    #make sure a response is the page wanted, and not an error or block page, returns the problem or None
+    #read the page, a chunk at a time when streaming so the rest of it isn't downloaded once everything wanted has been seen
+    def read_page(self, response, txt, name, finds):
+        page_type = self.get_page_type(name)
+        #a page that is read to the end anyway is quicker to parse in one go
+        if not self.FETCH_STREAM or response.status_code != 200 or self.page_enough[page_type] is None:
+            data = response.text.encode('utf8')
+            #the size sent over the network, which is the compressed size if the website compressed it
+            self.add_metric("fetch_bytes", int(response.headers.get("Content-Length", len(response.content))), txt)
+            return data, None
+        parser = page_parser(finds, self.page_enough[page_type])
+        try:
+            codec = codecs.lookup(response.encoding or "utf8")
+        except LookupError:
+            #a charset python doesn't know - guessing it would mean reading the whole page first, and the website sends utf8
+            codec = codecs.lookup("utf8")
+        decoder = codec.incrementaldecoder("replace")
+        text = []
+        try:
+            for chunk in response.iter_content(16384):
+                text.append(decoder.decode(chunk))
+                parser.feed(text[-1])
+                if parser.done():
+                    break
+            else:
+                text.append(decoder.decode(b"", True))
+                parser.feed(text[-1])
+            #only what was read counts, which is the compressed size if the website compressed it
+            self.add_metric("fetch_bytes", response.raw.tell(), txt)
+        finally:
+            #a page not read to the end can't go back in the pool, so this drops the connection
+            response.close()
+        parser.close()
+        return "".join(text).encode('utf8'), parser.vals
+
+    def check_page(self, response, data, txt, name):
+        if response.status_code != 200:
+            return "status " + str(response.status_code)
+        #the page should have all the values wanted from one of the known layouts
+        if self.detect_layout(txt, self.get_page_type(name), data) is None:
+            return "no known layout in the page"
+        return None
+
+    def page_worked(self, url, txt):
+        self.breakers.pop(url, None)
+        self.failed_pages.discard(txt)
+
+    def page_failed(self, url, txt, problem):
+        failures = self.breakers.get(url, [0, 0])[0] + 1
+        #once it has failed enough times, leave it out for a while, waiting twice as long after each failure
+        wait = min(self.BREAKER_WAIT * 2 ** max(0, failures - self.BREAKER_FAILS), 86400)
+        self.breakers[url] = [failures, time.time() + wait]
+        self.failed_pages.add(txt)
+        self.log("failed to get " + url + " - " + problem + ", keeping the stored page", level="WARNING")
+
+    #ask for the pages more often while their forecasts are moving, and less often while they aren't
+    def set_next_refresh(self, txt, moved):
+        meta = self.page_meta.setdefault(txt, {})
+        interval = meta.get("interval", self.REFRESH_MIN)
+        if moved:
+            interval = interval / 2
+        else:
+            interval = interval * 2
+        interval = min(self.REFRESH_MAX, max(self.REFRESH_MIN, interval))
+        meta["interval"] = interval
+        #a little randomness, so the pages spread out over time
+        meta["next"] = time.time() + interval * 3600 * random.uniform(0.9, 1.1)
+
+    #ask for a page that couldn't be got again after the shortest interval, or once its breaker lets it through
+    def set_retry_refresh(self, url, txt):
+        failures, retry_time = self.breakers.get(url, [0, 0])
+        if failures >= self.BREAKER_FAILS:
+            self.page_meta.setdefault(txt, {})["next"] = retry_time
+        else:
+            self.page_meta.setdefault(txt, {})["next"] = time.time() + self.REFRESH_MIN * 3600
+
+    #turn the values from a page into [state, value, phrase] for today and tomorrow, or None if the page didn't have them
+    def get_day_vals(self, page_type, vals):
+        if page_type == "air":
+            myvals, mytext, mystate = vals
+            #the air quality page has a current reading between today and tomorrow
+            if len(myvals) > 2:
+                return {"today": [myvals[0], myvals[0] + " - " + mytext[0], mystate[0]],
+                        "tomorrow": [myvals[2], myvals[2] + " - " + mytext[2], mystate[2]]}
+        else:
+            myvals, myconds = vals
+            if len(myvals) > 1:
+                return {"today": [self.cleanString(myvals[0].split('>')), myvals[0], myconds[0]],
+                        "tomorrow": [self.cleanString(myvals[1].split('>')), myvals[1], myconds[1]]}
+        return None
+
+    #the type of page, to know what to look for in it
+    def get_page_type(self, txt):
+        if txt in self.sensor_txt_set:
+            return self.sensor_txt_set[txt][0]
+        #the health activities page holds all the indexes
+        return "health"
+
+    #the names of all the pages for a location, in the order they are requested
+    def get_page_names(self, loc):
+        return [sets[1] for sets in loc["url_txt_sets"]] + [sets[2] for sets in loc["url_txt_xtd"]]
+
+    #read the settings for getting and keeping the pages
+    def read_settings(self):
+        self.ACC_FILE = self.args["ACC_FILE"]
+        #how many pages to request at once, how long to wait for each, and the gap between starting each
+        try:
+            self.FETCH_WORKERS = max(1, int(self.args["FETCH_WORKERS"]))
+        except:
+            self.FETCH_WORKERS = 4
+        try:
+            self.FETCH_TIMEOUT = float(self.args["FETCH_TIMEOUT"])
+        except:
+            self.FETCH_TIMEOUT = 20
+        try:
+            self.FETCH_DELAY = float(self.args["FETCH_DELAY"])
+        except:
+            self.FETCH_DELAY = 0
+        #how many times to try a page again, and the starting wait between tries
+        try:
+            self.FETCH_RETRIES = max(0, int(self.args["FETCH_RETRIES"]))
+        except:
+            self.FETCH_RETRIES = 2
+        try:
+            self.FETCH_BACKOFF = float(self.args["FETCH_BACKOFF"])
+        except:
+            self.FETCH_BACKOFF = 2
+        #read the pages a bit at a time, and stop once the values wanted from them have been seen
+        try:
+            self.FETCH_STREAM = bool(self.args["FETCH_STREAM"])
+        except:
+            self.FETCH_STREAM = True
+        #how many processes to parse the pages in, 0 to parse them in the app
+        try:
+            self.PARSE_PROCESSES = max(0, int(self.args["PARSE_PROCESSES"]))
+        except:
+            self.PARSE_PROCESSES = 0
+        #a file to share downloaded pages with other apps, how long in seconds a page is good for, and its largest size in MB
+        try:
+            self.SHARED_CACHE = self.args["SHARED_CACHE"]
+        except:
+            self.SHARED_CACHE = ""
+        try:
+            self.SHARED_CACHE_TTL = float(self.args["SHARED_CACHE_TTL"])
+        except:
+            self.SHARED_CACHE_TTL = 3600
+        try:
+            self.SHARED_CACHE_SIZE = float(self.args["SHARED_CACHE_SIZE"])
+        except:
+            self.SHARED_CACHE_SIZE = 50
+        if self.SHARED_CACHE:
+            self.page_cache = Accu_Page_Cache(self.SHARED_CACHE, self.SHARED_CACHE_TTL, self.SHARED_CACHE_SIZE * 1024 * 1024)
+        #how often to ask for each page, it is asked for less often while it isn't changing
+        try:
+            self.REFRESH_MIN = float(self.args["REFRESH_MIN"])
+        except:
+            self.REFRESH_MIN = 3
+        try:
+            self.REFRESH_MAX = max(self.REFRESH_MIN, float(self.args["REFRESH_MAX"]))
+        except:
+            self.REFRESH_MAX = max(self.REFRESH_MIN, 24)
+        self.fetch_lock = threading.Lock()
+        self.metrics_lock = threading.Lock()
+        self.breakers = {}
+        self.failed_pages = set()
+
+        #a list of locations, or the single location set at the top level
+        try:
+            location_args = self.args["LOCATIONS"]
+        except:
+            location_args = [{}]
+        self.locations = [self.get_location(loc_args) for loc_args in location_args]
+
+    #the app sends these to the AppDaemon log, on their own they go to stderr
+    def log(self, msg, level="INFO", **kwargs):
+        if self.verbose or level != "INFO":
+            print(level + " " + str(msg), file=sys.stderr)
+
+    def set_refresh_status(self, status):
+        self.refresh_status = status
+
+    #let go of the connections and the parsing processes
+    def close_pipeline(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+            self.parse_pool = None
+
+    #the values from each page of a location - [state, value, phrase] for today and tomorrow, or for the health page today's level of each index
+    def location_values(self, loc):
+        values = {}
+        for txt in self.get_page_names(loc):
+            page_type = self.get_page_type(txt)
+            vals = self.get_page_vals(loc["key"] + txt, page_type)
+            if page_type == "health":
+                levels = {}
+                for val, level in zip(vals[0], vals[1]):
+                    levels.setdefault(val.strip(), level)
+                values[txt] = levels
+            else:
+                values[txt] = self.get_day_vals(page_type, vals)
+        return values
+
+
+#a pipeline for the settings, outside of AppDaemon
+def make_pipeline(args, url_base=None):
+    pipeline = Accu_Pipeline()
+    pipeline.args = args
+    if url_base:
+        pipeline.url_base = url_base
+    pipeline.read_settings()
+    return pipeline
+
+
+#the app settings from a JSON or YAML file, either just the settings or a whole apps.yaml
+def read_config(path, app=None):
+    with open(path) as config_file:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            config = yaml.safe_load(config_file)
+        else:
+            config = json.load(config_file)
+    apps = {name: value for name, value in config.items() if isinstance(value, dict) and value.get("module") == "accu_allergies"}
+    if app is not None:
+        return config[app]
+    if len(apps) == 1:
+        return list(apps.values())[0]
+    if apps:
+        raise SystemExit("more than one app in " + path + ", pick one with --app: " + ", ".join(apps))
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Get or replay the Accuweather allergy pages without AppDaemon, and print the values as JSON")
+    parser.add_argument("--config", help="a JSON or YAML file with the app settings, or a whole apps.yaml")
+    parser.add_argument("--app", help="the app to use from the config file, if it has more than one")
+    parser.add_argument("--location", action="append", default=[], metavar="COUNTRY/CITY/ID", help="a location to get, can be given more than once, eg au/canberra/21921")
+    parser.add_argument("--web-ver", default="", help="the website template for the --location values, blank or APRIL22")
+    parser.add_argument("--acc-file", help="the save file to use, otherwise a new one that is thrown away, or the one in the config for --replay")
+    parser.add_argument("--replay", action="store_true", help="read the pages already in the save file instead of asking the website, the one in the config if there is no --acc-file")
+    parser.add_argument("--url-base", help="ask this site for the pages instead, eg a local copy of them")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="an app setting, can be given more than once")
+    parser.add_argument("--profile", action="store_true", help="add the timings for each page to the output, and print where the cpu time went to stderr")
+    parser.add_argument("--verbose", action="store_true", help="print the log to stderr")
+    options = parser.parse_args(argv)
+
+    settings = {}
+    if options.config:
+        try:
+            settings = read_config(options.config, options.app)
+        except KeyError:
+            parser.error("there is no app " + options.app + " in " + options.config)
+    if options.location:
+        settings["LOCATIONS"] = []
+        for location in options.location:
+            parts = location.split("/")
+            if len(parts) != 3 or "" in parts:
+                parser.error("--location should be COUNTRY/CITY/ID, eg au/canberra/21921, not " + location)
+            country, city, url_id = parts
+            settings["LOCATIONS"].append({"URL_COUNTRY": country, "URL_CITY": city, "URL_ID": url_id, "WEB_VER": options.web_ver})
+    #settings are read like the yaml would give them - numbers and true/false, anything else is a string
+    for setting in options.set:
+        if "=" not in setting:
+            parser.error("--set should be NAME=VALUE, not " + setting)
+        name, value = setting.split("=", 1)
+        try:
+            settings[name] = json.loads(value)
+        except ValueError:
+            settings[name] = value
+
+    #the save file in the config belongs to the running app, so it is only read, for a replay
+    if options.replay and not options.acc_file and "ACC_FILE" not in settings:
+        parser.error("--replay needs --acc-file or an ACC_FILE in the config")
+
+    with tempfile.TemporaryDirectory() as folder:
+        if options.acc_file:
+            settings["ACC_FILE"] = options.acc_file
+        elif not options.replay:
+            settings["ACC_FILE"] = os.path.join(folder, "allergies")
+        pipeline = make_pipeline(settings, options.url_base)
+        pipeline.verbose = options.verbose
+
+        profiler = None
+        if options.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            if options.replay:
+                #a missing file would otherwise be made, and give nothing but empty values
+                try:
+                    pipeline.load_data(read_only=True)
+                except (OSError, *dbm.error) as problem:
+                    parser.error("can't read the save file " + settings["ACC_FILE"] + ": " + str(problem))
+            else:
+                pipeline.get_html_data()
+            output = {"locations": [{"prefix": loc["prefix"], "name": loc["name"].strip(), "url": loc["start_url"], "pages": pipeline.location_values(loc)} for loc in pipeline.locations]}
+        finally:
+            pipeline.close_pipeline()
+        duration = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+
+    output["failed_pages"] = sorted(pipeline.failed_pages)
+    output["seconds"] = round(duration, 3)
+    if profiler is not None:
+        import pstats
+        output["metrics"] = pipeline.metrics
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+    json.dump(output, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
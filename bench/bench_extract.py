@@ -0,0 +1,112 @@
+############################################################
+#
+# Benchmark for pulling the gauge/cond values out of a page
+#
+# compares the old full BeautifulSoup parse with the lxml and
+# built in parser paths used by the app
+#
+# each way is run in its own process, so the peak memory is the
+# whole process (including lxml's C memory) and one way's memory
+# doesn't count towards the next
+#
+# run from the repository folder
+#   python bench/bench_extract.py
+#
+############################################################
+
+import importlib
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "apps", "accu_allergies"))
+import accu_pipeline
+
+RUNS = 5
+FINDS = [["div", "gauge"], ["div", "cond"]]
+
+#build a page shaped like an accuweather index page - scripts in the head, the 12 day gauges, then lots of other markup
+def build_page():
+    head = "<script>window.dataLayer = window.dataLayer || [];</script>" * 60
+    days = "".join('<a class="forecast-card"><div class="date">Day ' + str(i) + '</div><div class="gauge">' + str(i % 10 + 1) + '</div><div class="cond">Moderate</div></a>' for i in range(12))
+    cards = "".join('<div class="content-module"><a href="/en/au/canberra/21921/' + str(i) + '"><span class="label">Link ' + str(i) + '</span><img src="/images/' + str(i) + '.png"></a><p>Nearby &amp; related</p></div>' for i in range(3000))
+    page = "<html><head><title>Allergies</title>" + head + "</head><body>" + days + cards + "<footer>" + "<script>var a = 1;</script>" * 60 + "</footer></body></html>"
+    return page.encode("utf8")
+
+#the way the app read a page before - a full BeautifulSoup tree then a scan for each value
+def soup_vals(html_info, finds):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_info, "html.parser")
+    return [[found.text for found in soup.find_all(tag, cls)] for tag, cls in finds]
+
+def lxml_vals(html_info, finds):
+    return accu_pipeline.extract_vals(html_info, finds)
+
+def builtin_vals(html_info, finds):
+    saved = accu_pipeline.lxml
+    accu_pipeline.lxml = None
+    try:
+        return accu_pipeline.extract_vals(html_info, finds)
+    finally:
+        accu_pipeline.lxml = saved
+
+ENGINES = {"soup": ["bs4 html.parser (old)", soup_vals],
+           "lxml": ["lxml xpath", lxml_vals],
+           "builtin": ["built in parser", builtin_vals]}
+
+#the highest resident memory of this process so far in KB - linux gives KB, macos gives bytes
+def max_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+#run one way in this process and print its numbers as JSON for main
+def measure(engine):
+    func = ENGINES[engine][1]
+    page = build_page()
+    #load everything before the starting memory is taken, so only the parsing counts
+    accu_pipeline.load_lxml()
+    if engine == "soup":
+        importlib.import_module("bs4")
+    before = max_rss()
+    #cpu time over a few runs
+    start = time.process_time()
+    for i in range(RUNS):
+        vals = func(page, FINDS)
+    cpu = (time.process_time() - start) / RUNS
+    json.dump({"cpu": cpu, "peak": max_rss() - before, "vals": vals}, sys.stdout)
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--engine":
+        measure(sys.argv[2])
+        return
+
+    print("page size " + str(len(build_page()) // 1024) + " KB, " + str(RUNS) + " runs each")
+    engines = []
+    if importlib.util.find_spec("bs4") is not None:
+        engines.append("soup")
+    else:
+        print("bs4 not installed, skipping the old path")
+    if importlib.util.find_spec("lxml") is not None:
+        engines.append("lxml")
+    else:
+        print("lxml not installed, skipping the lxml path")
+    engines.append("builtin")
+
+    expected = None
+    for engine in engines:
+        result = json.loads(subprocess.run([sys.executable, os.path.abspath(__file__), "--engine", engine], check=True, capture_output=True, text=True).stdout)
+        if expected is None:
+            expected = result["vals"]
+        match = "same values" if result["vals"] == expected else "DIFFERENT VALUES"
+        print("{:<24} cpu {:8.1f} ms   peak rss +{:8.1f} KB   {}".format(ENGINES[engine][0], result["cpu"] * 1000, result["peak"], match))
+
+    print("note: peak rss is how far the parsing raised the process's resident memory, C memory included")
+
+if __name__ == "__main__":
+    main()
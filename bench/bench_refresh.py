@@ -0,0 +1,310 @@
+############################################################
+#
+# Offline benchmark for a whole refresh cycle of the app
+#
+# replays saved accuweather pages from a local web server and runs
+# the app on a stand in for the appdaemon Hass class, so no network,
+# appdaemon or HA is needed
+#
+# reports wall time, cpu time, peak python memory, shelve opens,
+# page requests and set_state calls for each step
+#
+# run from the repository folder
+#   python bench/bench_refresh.py
+#
+# saved pages are read from bench/fixtures, named after the page in
+# the url, eg health-activities.html, air-quality-index.html or
+# allergies-weather-grass-pollen.html - any page without a fixture is
+# replaced by a made up page with the same layout
+#
+# any app setting can be changed for a run, eg to parse in 4 processes
+#   python bench/bench_refresh.py --set PARSE_PROCESSES=4
+#
+# to record real pages for a location into bench/fixtures
+#   python bench/bench_refresh.py --record
+#
+############################################################
+
+import argparse
+import hashlib
+import http.server
+import json
+import multiprocessing
+import os
+import shelve
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import urllib.parse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+APP_DIR = os.path.join(BENCH_DIR, "..", "apps", "accu_allergies")
+
+LOCATION = {"URL_ID": "21921", "URL_CITY": "canberra", "URL_COUNTRY": "au", "URL_LANG": "en", "URL_POSTCODE": ""}
+
+
+#stand in for the appdaemon Hass class, keeping count of the sensors sent to HA
+class Fake_Hass:
+
+    def __init__(self, args):
+        self.args = args
+        self.set_state_calls = 0
+        self.states = {}
+
+    def set_state(self, entity_id, state=None, attributes=None, replace=False, **kwargs):
+        self.set_state_calls += 1
+        self.states[entity_id] = [state, attributes]
+
+    def log(self, msg, *args, **kwargs):
+        pass
+
+    def listen_state(self, *args, **kwargs):
+        pass
+
+    def listen_event(self, *args, **kwargs):
+        pass
+
+    def run_daily(self, *args, **kwargs):
+        pass
+
+    def run_in(self, *args, **kwargs):
+        pass
+
+    def turn_off(self, *args, **kwargs):
+        pass
+
+
+#load the app on top of the stand in Hass class
+def load_app_module():
+    hassapi = types.ModuleType("appdaemon.plugins.hass.hassapi")
+    hassapi.Hass = Fake_Hass
+    for name in ["appdaemon", "appdaemon.plugins", "appdaemon.plugins.hass"]:
+        sys.modules[name] = types.ModuleType(name)
+    sys.modules["appdaemon.plugins.hass.hassapi"] = hassapi
+    sys.modules["appdaemon"].plugins = sys.modules["appdaemon.plugins"]
+    sys.modules["appdaemon.plugins"].hass = sys.modules["appdaemon.plugins.hass"]
+    sys.modules["appdaemon.plugins.hass"].hassapi = hassapi
+    sys.path.insert(0, APP_DIR)
+    import accu_allergies
+    return accu_allergies
+
+
+#the fixture name for a url - the page part of the path, plus the name query if there is one
+def fixture_name(url, with_query=True):
+    parts = urllib.parse.urlsplit(url)
+    segments = [seg for seg in parts.path.split("/") if seg]
+    name = segments[-2] if len(segments) >= 2 else "index"
+    query = urllib.parse.parse_qs(parts.query)
+    if with_query and "name" in query:
+        name += "-" + query["name"][0]
+    return name
+
+
+#made up pages with the same layout as the accuweather pages, for any page that hasn't been recorded
+def made_up_page(name):
+    head = "<script>window.dataLayer = window.dataLayer || [];</script>" * 40
+    filler = "".join('<div class="content-module"><a href="/en/au/canberra/21921/' + str(i) + '"><span class="label">Link ' + str(i) + '</span></a><p>Nearby &amp; related</p></div>' for i in range(800))
+    seed = int(hashlib.md5(name.encode("utf8")).hexdigest(), 16)
+    if name.startswith("health-activities"):
+        names = ["Dust & Dander", "Sinus Pressure", "Asthma", "Grass Pollen", "Ragweed Pollen", "Tree Pollen", "Mold", "Migraine", "Arthritis", "Common Cold", "Flu", "Indoor Pests", "Outdoor Pests", "Mosquitos", "Outdoor Entertaining", "Lawn Mowing", "Composting", "Air Travel", "Driving", "Fishing", "Running", "Golf", "Biking & Cycling", "Beach & Pool", "Stargazing", "Hiking"]
+        levels = ["Low", "Moderate", "High", "Very High", "Extreme"]
+        body = "".join('<a class="index-list-card"><div class="index-name">' + n.replace("&", "&amp;") + '</div><div class="index-status-text">' + levels[(seed + i) % 5] + '</div></a>' for i, n in enumerate(names))
+    elif name.startswith("air-quality-index"):
+        body = "".join('<div class="aq-card"><div class="aq-number">' + str(20 + (seed + i) % 60) + '</div><p class="category-text">Fair</p><p class="statement">The air quality is generally acceptable for most individuals.</p></div>' for i in range(8))
+    else:
+        conds = ["Low", "Moderate", "High", "Very High"]
+        body = "".join('<a class="forecast-card"><div class="date">Day ' + str(i) + '</div><div class="gauge">' + str((seed + i) % 10 + 1) + '</div><div class="cond">' + conds[(seed + i) % 4] + '</div></a>' for i in range(12))
+    return ("<html><head><title>" + name + "</title>" + head + "</head><body>" + body + filler + "<footer>" + "<script>var a = 1;</script>" * 40 + "</footer></body></html>").encode("utf8")
+
+
+def get_fixture(url):
+    #the allergies and cold/flu pages for each index can share one recording of the page
+    for name in [fixture_name(url), fixture_name(url, False)]:
+        path = os.path.join(FIXTURE_DIR, name + ".html")
+        if os.path.exists(path):
+            with open(path, "rb") as fixture:
+                return fixture.read()
+    return made_up_page(fixture_name(url))
+
+
+#local stand in for the website, with etags so conditional requests can be tested
+def serve_fixtures(port_value, hits):
+
+    class Fixture_Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with hits.get_lock():
+                hits.value += 1
+            page = get_fixture(self.path)
+            etag = '"' + hashlib.md5(page).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, *args):
+            pass
+
+    class Fixture_Server(http.server.ThreadingHTTPServer):
+
+        #the app hangs up part way through a page once it has the values it wants
+        def handle_error(self, request, client_address):
+            if not isinstance(sys.exc_info()[1], ConnectionError):
+                super().handle_error(request, client_address)
+
+    server = Fixture_Server(("127.0.0.1", 0), Fixture_Handler)
+    port_value.value = server.server_address[1]
+    server.serve_forever()
+
+
+#counts the shelve opens made by the app
+class Open_Counter:
+
+    def __init__(self):
+        self.count = 0
+        self.real_open = shelve.open
+        shelve.open = self.open
+
+    def open(self, *args, **kwargs):
+        self.count += 1
+        return self.real_open(*args, **kwargs)
+
+
+def wait_for_app(app):
+    if getattr(app, "worker", None) is not None:
+        app.worker.submit(lambda: None).result()
+
+
+#make every page due, then run the refresh
+def refresh_all(app):
+    for txt in app.page_meta:
+        app.page_meta[txt]["next"] = 0
+    app.refresh_due_run()
+
+
+def make_app(module, base, acc_file, web_ver, settings=None):
+    args = {"ACC_FILE": acc_file, "ACC_FLAG": "input_boolean.get_allergies_data", "DEB_FLAG": "input_boolean.reset_allergies_sensor", "WEB_VER": web_ver}
+    args.update(LOCATION)
+    args.update(settings or {})
+    app = module.Get_Accu_Allergies(args)
+    app.url_base = base
+    return app
+
+
+#time one step of the app, returning the numbers for the report
+def measure(step, app, opens, hits):
+    opens.count = 0
+    hits_before = hits.value
+    calls_before = app.set_state_calls
+    tracemalloc.start()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    step()
+    wait_for_app(app)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return [wall, cpu, peak, opens.count, hits.value - hits_before, app.set_state_calls - calls_before]
+
+
+def run_bench(module, base, hits, runs, settings):
+    opens = Open_Counter()
+    print("{:<10} {:<22} {:>9} {:>9} {:>10} {:>7} {:>9} {:>10}".format("layout", "step", "wall ms", "cpu ms", "peak KB", "opens", "requests", "set_state"))
+    for web_ver in ["", "APRIL22"]:
+        results = {}
+        for run in range(runs):
+            folder = tempfile.mkdtemp()
+            acc_file = os.path.join(folder, "allergies")
+            app = make_app(module, base, acc_file, web_ver, settings)
+
+            steps = []
+            #first start with nothing saved - download, parse and send everything
+            steps.append(["cold start", app.initialize])
+            #a refresh when the website has nothing new
+            steps.append(["refresh, unchanged", lambda: refresh_all(app)])
+            #the sensor reset flag
+            steps.append(["sensor reset flag", lambda: app.set_acc_sensors(None, None, "off", "on", {})])
+            for name, step in steps:
+                results.setdefault(name, []).append(measure(step, app, opens, hits))
+            app.terminate()
+
+            #appdaemon restarting with the saved file
+            restarted = make_app(module, base, acc_file, web_ver, settings)
+            results.setdefault("restart", []).append(measure(restarted.initialize, restarted, opens, hits))
+            restarted.terminate()
+
+        for name in results:
+            #report the middle run for each step
+            rows = sorted(results[name], key=lambda row: row[0])
+            wall, cpu, peak, open_count, requests_made, calls = rows[len(rows) // 2]
+            print("{:<10} {:<22} {:>9.1f} {:>9.1f} {:>10.1f} {:>7} {:>9} {:>10}".format(web_ver or "pre APR22", name, wall * 1000, cpu * 1000, peak / 1024, open_count, requests_made, calls))
+    shelve.open = opens.real_open
+    print("cpu time and peak memory are for this process only, the web server runs separately")
+
+
+#save the real pages for the location into the fixtures folder
+def record(module, web_ver):
+    import requests
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    app = make_app(module, "https://www.accuweather.com", os.path.join(tempfile.mkdtemp(), "allergies"), web_ver)
+    loc = app.get_location({})
+    urls = [loc["start_url"] + sets[0] + loc["url_id"] for sets in loc["url_txt_sets"]]
+    urls += [loc["start_url"] + sets[0] + loc["url_id"] + sets[1] for sets in loc["url_txt_xtd"]]
+    for url in urls:
+        response = requests.get(url, headers=app.headers, timeout=30)
+        path = os.path.join(FIXTURE_DIR, fixture_name(url) + ".html")
+        with open(path, "wb") as fixture:
+            fixture.write(response.content)
+        print(str(response.status_code) + " " + url + " -> " + path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the accu_allergies refresh cycle")
+    parser.add_argument("--runs", type=int, default=3, help="how many times to run each step")
+    parser.add_argument("--record", action="store_true", help="save the real pages for the location into bench/fixtures")
+    parser.add_argument("--web-ver", default="", help="layout to record, blank or APRIL22")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="an app setting for the run, can be given more than once")
+    options = parser.parse_args()
+
+    #settings are read like the yaml would give them - numbers and true/false, anything else is a string
+    settings = {}
+    for setting in options.set:
+        name, value = setting.split("=", 1)
+        try:
+            settings[name] = json.loads(value)
+        except ValueError:
+            settings[name] = value
+
+    module = load_app_module()
+    if options.record:
+        record(module, options.web_ver)
+        return
+
+    #run the web server in its own process so it doesn't count towards the app's cpu time
+    port_value = multiprocessing.Value("i", 0)
+    hits = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(target=serve_fixtures, args=(port_value, hits), daemon=True)
+    server.start()
+    while port_value.value == 0:
+        time.sleep(0.01)
+    try:
+        run_bench(module, "http://127.0.0.1:" + str(port_value.value), hits, options.runs, settings)
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()